@@ -1,12 +1,19 @@
 import argparse
+import multiprocessing
 
 from baroque import defaults
+from baroque.audio_qc_validation import AUDIO_QC_AVAILABLE, AudioQcValidator
 from baroque.baroque_project import BaroqueProject
 from baroque.config import get_config_setting
+from baroque.duration_validation import DurationValidator
+from baroque.fixity_validation import FixityValidator
+from baroque.io_scheduler import DEFAULT_READERS_PER_DEVICE
 from baroque.mets_validation import MetsValidator
-from baroque.report_generation import generate_reports
+from baroque.mp3_validation import Mp3Validator
+from baroque.report_generation import generate_reports, REPORT_WRITERS
 from baroque.structure_validation import StructureValidator
 from baroque.wav_bext_chunk_validation import WavBextChunkValidator
+from baroque.wav_integrity_validation import WavIntegrityValidator
 
 
 def main():
@@ -14,6 +21,42 @@ def main():
     parser.add_argument("source", help="Path to source directory")
     parser.add_argument("export", help="Path to metadata export")
     parser.add_argument("-d", "--destination", help="Path to destination for reports")
+    parser.add_argument(
+                        "--bwfmetaedit", action="store_true",
+                        help="Read WAV BEXT chunks with BWF MetaEdit instead of the built-in reader"
+                        )
+    parser.add_argument(
+                        "--workers", type=int, default=1,
+                        help="Number of WAV files to validate, hash or check in parallel"
+                        )
+    parser.add_argument(
+                        "--readers-per-device", type=int, default=DEFAULT_READERS_PER_DEVICE,
+                        help="Maximum number of files hashed or checked at once from each disk or network share"
+                        )
+    parser.add_argument(
+                        "--processes", type=int, nargs="?", default=1, const=0,
+                        help="Number of processes for METS validation (one per CPU core if no number is given)"
+                        )
+    parser.add_argument(
+                        "--stream-mets", action="store_true",
+                        help="Parse METS one section at a time to limit memory use on very large METS files"
+                        )
+    parser.add_argument(
+                        "--no-cache", action="store_true",
+                        help="Revalidate and rehash every file without reading or storing results and checksums cached by previous runs"
+                        )
+    parser.add_argument(
+                        "--rehash", action="store_true",
+                        help="Recompute every checksum instead of reusing checksums cached by previous runs"
+                        )
+    parser.add_argument(
+                        "--invalidate-checksums", nargs="?", const="", metavar="PATH",
+                        help="Remove the checksums cached by previous runs for a file or directory (all checksums if no path is given)"
+                        )
+    parser.add_argument(
+                        "--report-format", choices=sorted(REPORT_WRITERS.keys()), default="csv",
+                        help="Format of the error report (default: csv)"
+                        )
 
     action_args = parser.add_argument_group("actions")
     action_args.add_argument(
@@ -31,35 +74,94 @@ def main():
                             action="append_const", const="wav",
                             help="Validate WAV BEXT chunks"
                             )
+    action_args.add_argument(
+                            "--wav-integrity", dest="actions",
+                            action="append_const", const="wav_integrity",
+                            help="Validate WAV headers against file sizes and CodingHistory"
+                            )
+    action_args.add_argument(
+                            "--mp3", dest="actions",
+                            action="append_const", const="mp3",
+                            help="Validate MP3 frame headers"
+                            )
+    action_args.add_argument(
+                            "--durations", dest="actions",
+                            action="append_const", const="durations",
+                            help="Validate that the WAV and MP3 files in each digital part have the same duration"
+                            )
+    action_args.add_argument(
+                            "--fixity", dest="actions",
+                            action="append_const", const="fixity",
+                            help="Validate files against their MD5 checksum files"
+                            )
+    action_args.add_argument(
+                            "--audio-qc", dest="actions",
+                            action="append_const", const="audio_qc",
+                            help="Check preservation master audio for silence, clipping and DC offset (requires NumPy)"
+                            )
     action_args.add_argument(
                             "--all", dest="actions", action="store_const",
-                            const=["structure", "mets", "wav"],
-                            help="Run all validations"
+                            const=["structure", "mets", "wav", "wav_integrity", "mp3", "durations"],
+                            help="Run structure, METS, WAV BEXT chunk, WAV integrity, MP3 and duration validations"
                             )
     args = parser.parse_args()
 
     if args.actions:
         actions = set(args.actions)
+    elif args.invalidate_checksums is not None:
+        actions = set()
     else:
         parser.error("Please supply a validation action.")
+    if args.invalidate_checksums is not None and args.no_cache:
+        parser.error("--invalidate-checksums cannot be used with --no-cache")
+    if "audio_qc" in actions and not AUDIO_QC_AVAILABLE:
+        parser.error("--audio-qc requires NumPy; install it with pip install numpy")
 
     if args.destination:
         destination = args.destination
     else:
         destination = get_config_setting("destination", default=defaults.REPORTS_DIR)
 
-    project = BaroqueProject(args.source, destination, args.export)
-    if "structure" in actions:
-        StructureValidator(project).validate()
-    if "mets" in actions:
-        MetsValidator(project).validate()
-    if "wav" in actions:
-        WavBextChunkValidator(project).validate()
+    project = BaroqueProject(args.source, destination, args.export, use_cache=not args.no_cache, rehash=args.rehash)
+    # Write errors to the report as they are found, so that a run that crashes or is interrupted keeps them
+    report_writer = REPORT_WRITERS[args.report_format]
+    project.errors.attach(report_writer(project.source_directory, project.destination_directory))
+    try:
+        if args.invalidate_checksums is not None:
+            invalidated = project.get_checksum_cache().invalidate(args.invalidate_checksums or None)
+            print("SYSTEM REPORT: removed cached checksums for {} file(s)".format(invalidated))
+        if "structure" in actions:
+            StructureValidator(project).validate()
+        if "mets" in actions:
+            MetsValidator(project, processes=args.processes, streaming=args.stream_mets).validate()
+        if "wav" in actions:
+            WavBextChunkValidator(project, use_bwfmetaedit=args.bwfmetaedit, workers=args.workers).validate()
+        if "wav_integrity" in actions:
+            WavIntegrityValidator(project, workers=args.workers).validate()
+        if "mp3" in actions:
+            Mp3Validator(project, workers=args.workers).validate()
+        if "durations" in actions:
+            DurationValidator(project, workers=args.workers).validate()
+        if "fixity" in actions:
+            FixityValidator(project, workers=args.workers, readers_per_device=args.readers_per_device).validate()
+        if "audio_qc" in actions:
+            AudioQcValidator(project, workers=args.workers, readers_per_device=args.readers_per_device).validate()
 
-    generate_reports(project)
+        if project.cache:
+            project.cache.evict_missing(project.source_directory, project.entries)
+            print("SYSTEM REPORT: reused cached results for {} file(s) and validated {} file(s)".format(project.cache.hits, project.cache.misses))
+            project.cache.close()
+        if project.checksum_cache:
+            project.checksum_cache.evict_missing(project.source_directory, project.entries)
+    finally:
+        generate_reports(project)
+        if project.checksum_cache:
+            project.checksum_cache.close()
 
 
 if __name__ == "__main__":
+    # Needed for process pools in the frozen Windows executable
+    multiprocessing.freeze_support()
     print("SYSTEM ACTIVITY: baroque starting")
     main()
     print("SYSTEM ACTIVITY: baroque finished")
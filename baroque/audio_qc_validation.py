@@ -0,0 +1,292 @@
+import math
+from tqdm import tqdm
+
+from .baroque_validator import BaroqueValidator
+from .io_scheduler import DEFAULT_READERS_PER_DEVICE, IOScheduler
+from .utils import format_time
+from .wav_chunks import read_wav_header, WavChunkError
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is only needed for --audio-qc
+    numpy = None
+
+
+AUDIO_QC_AVAILABLE = numpy is not None
+# Audio data is decoded in windows of this many sample frames (6 MiB for 24-bit stereo), so memory use does not depend on file size
+AUDIO_QC_WINDOW_FRAMES = 1024 * 1024
+# Frames where every channel is at or below this level are silent
+SILENCE_THRESHOLD_DBFS = -70
+# Silence at the start or end of a file longer than this is reported
+EDGE_SILENCE_SECONDS = 30
+# Silence within a file longer than this is reported (e.g., a dropout)
+INTERNAL_SILENCE_SECONDS = 1
+# Runs of at least this many consecutive frames with a sample at full scale are reported as clipping
+CLIPPED_RUN_FRAMES = 3
+# A channel whose mean sample value is above this level has a DC offset
+DC_OFFSET_THRESHOLD_DBFS = -50
+# Silence and clipping runs reported per file; further runs are counted in one more warning
+MAX_REPORTED_RUNS = 10
+# WAVE_FORMAT_PCM and WAVE_FORMAT_EXTENSIBLE
+PCM_FORMAT_TAGS = [0x0001, 0xFFFE]
+PCM_BITS_PER_SAMPLE = [16, 24, 32]
+
+
+def to_dbfs(amplitude, full_scale):
+    """
+    Helper function to express an amplitude in decibels relative to full scale"""
+    if amplitude <= 0:
+        return -math.inf
+    return 20 * math.log10(amplitude / full_scale)
+
+
+class RunTracker:
+    """
+    Finds runs of frames for which a boolean mask is True, when the mask is computed one window at a time.
+    Runs that continue from one window to the next are joined.
+    Only runs at least min_length frames long are kept (up to max_runs), but all of them are counted,
+    and the first and last runs are kept regardless of their length.
+    """
+
+    def __init__(self, min_length, max_runs=MAX_REPORTED_RUNS):
+        self.min_length = min_length
+        self.max_runs = max_runs
+        self.runs = []
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.position = 0
+        self.run_start = None
+
+    def _add_runs(self, starts, ends):
+        if not len(starts):
+            return
+        if self.first is None:
+            self.first = (int(starts[0]), int(ends[0]))
+        self.last = (int(starts[-1]), int(ends[-1]))
+        long_runs = numpy.flatnonzero(ends - starts >= self.min_length)
+        self.count += len(long_runs)
+        for index in long_runs[:self.max_runs - len(self.runs)]:
+            self.runs.append((int(starts[index]), int(ends[index])))
+
+    def update(self, mask):
+        """
+        Adds the mask for the next window of frames"""
+        if not len(mask):
+            return
+        changes = numpy.flatnonzero(mask[1:] != mask[:-1]) + 1
+        boundaries = numpy.concatenate(([0], changes, [len(mask)])) + self.position
+        segment_starts = boundaries[:-1]
+        segment_ends = boundaries[1:]
+        in_run = mask[segment_starts - self.position]
+        starts = segment_starts[in_run]
+        ends = segment_ends[in_run]
+
+        if self.run_start is not None:
+            if mask[0]:
+                starts[0] = self.run_start
+            else:
+                self._add_runs(numpy.array([self.run_start]), numpy.array([self.position]))
+        if mask[-1]:
+            self.run_start = int(starts[-1])
+            starts = starts[:-1]
+            ends = ends[:-1]
+        else:
+            self.run_start = None
+
+        self._add_runs(starts, ends)
+        self.position += len(mask)
+
+    def finish(self):
+        """
+        Ends a run that continues to the end of the file"""
+        if self.run_start is not None:
+            self._add_runs(numpy.array([self.run_start]), numpy.array([self.position]))
+            self.run_start = None
+
+
+class AudioQcValidator(BaroqueValidator):
+    def __init__(self, project, workers=1, readers_per_device=DEFAULT_READERS_PER_DEVICE):
+        validation = "audio_qc"
+        validator = self.validate_audio_qc
+        super().__init__(validation, validator, project)
+        self.workers = workers
+        self.readers_per_device = readers_per_device
+
+    def get_paths_to_pms(self):
+        """
+        Returns each item's preservation master WAV files (e.g., 85429-SR-1-1-pm.wav) and the item's ID, sorted by path"""
+        tasks = []
+        for item in self.project.items:
+            for path_to_wav in self.project.get_item_file_paths(item, "wav"):
+                if path_to_wav.endswith("-pm.wav"):
+                    tasks.append((path_to_wav, item["id"]))
+
+        return sorted(tasks)
+
+    def decode_window(self, raw, size, bits_per_sample, decoded):
+        """
+        Decodes size bytes of little-endian PCM into an array of interleaved integer samples
+        24-bit samples are read as overlapping 32-bit integers three bytes apart (raw has a spare byte at the end for the
+        last sample), and the fourth byte, which belongs to the next sample, is shifted out while keeping the sign"""
+        if bits_per_sample == 16:
+            return raw[:size].view("<i2")
+        if bits_per_sample == 32:
+            return raw[:size].view("<i4")
+
+        count = size // 3
+        overlapping = numpy.ndarray((count,), dtype="<i4", buffer=raw, strides=(3,))
+        samples = decoded[:count]
+        numpy.left_shift(overlapping, 8, out=samples)
+        numpy.right_shift(samples, 8, out=samples)
+        return samples
+
+    def frames_in_range(self, samples, channels, low, high, scratch):
+        """
+        Returns a mask of the frames in which every channel's sample is between low and high
+        Subtracting low wraps samples below it around to large unsigned values, so one comparison checks both bounds"""
+        offset = scratch[:len(samples)]
+        numpy.subtract(samples, samples.dtype.type(low), out=offset)
+        in_range = offset.view("<u{}".format(offset.itemsize)) <= high - low
+        frames = in_range[0::channels].copy()
+        for channel in range(1, channels):
+            frames &= in_range[channel::channels]
+        return frames
+
+    def analyze_audio(self, path_to_wav, header):
+        """
+        Reads a WAV file's data chunk in windows of AUDIO_QC_WINDOW_FRAMES frames
+        Returns the number of frames, RunTrackers for silent and clipped frames and the sum of each channel's samples"""
+        fmt = header["fmt"]
+        channels = fmt["channels"]
+        bits_per_sample = fmt["bits_per_sample"]
+        block_align = fmt["block_align"]
+        full_scale = 2 ** (bits_per_sample - 1)
+        silence_amplitude = int(full_scale * 10 ** (SILENCE_THRESHOLD_DBFS / 20))
+
+        data_size = min(header["data_size"], header["file_size"] - header["data_offset"])
+        data_size -= data_size % block_align
+        silence = RunTracker(int(INTERNAL_SILENCE_SECONDS * fmt["sample_rate"]))
+        clipping = RunTracker(CLIPPED_RUN_FRAMES)
+        sums = [0] * channels
+
+        # Buffers are allocated once per file and reused for every window
+        window_size = AUDIO_QC_WINDOW_FRAMES * block_align
+        raw = numpy.zeros(window_size + 1, dtype=numpy.uint8)
+        sample_type = "<i2" if bits_per_sample == 16 else "<i4"
+        decoded = numpy.empty(AUDIO_QC_WINDOW_FRAMES * channels, dtype=sample_type) if bits_per_sample == 24 else None
+        scratch = numpy.empty(AUDIO_QC_WINDOW_FRAMES * channels, dtype=sample_type)
+        remaining = data_size
+        with open(path_to_wav, "rb") as f:
+            f.seek(header["data_offset"])
+            while remaining:
+                size = f.readinto(memoryview(raw)[:min(window_size, remaining)])
+                size -= size % block_align
+                if not size:
+                    break
+                remaining -= size
+                samples = self.decode_window(raw, size, bits_per_sample, decoded)
+
+                silence.update(self.frames_in_range(samples, channels, -silence_amplitude, silence_amplitude, scratch))
+                # Samples at full scale, or one step below positive full scale, are clipped
+                clipping.update(~self.frames_in_range(samples, channels, -full_scale + 1, full_scale - 2, scratch))
+                for channel in range(channels):
+                    sums[channel] += int(samples[channel::channels].sum(dtype=numpy.int64))
+
+        silence.finish()
+        clipping.finish()
+        return silence.position, silence, clipping, sums
+
+    def report_runs(self, path_to_wav, item_id, runs, count, message, description, sample_rate):
+        """
+        Warns about each run of silent or clipped frames, up to MAX_REPORTED_RUNS, and about the number of further runs
+        message is formatted with the run's length in frames and seconds and its start time"""
+        for start, end in runs:
+            self.warn(
+                path_to_wav,
+                item_id,
+                message.format(frames=end - start, seconds=(end - start) / sample_rate, time=format_time(start / sample_rate))
+            )
+        if count > len(runs):
+            self.warn(path_to_wav, item_id, "{} more {} run(s) not listed".format(count - len(runs), description))
+
+    def check_audio(self, path_to_wav, item_id):
+        """
+        Checks a preservation master's audio for leading and trailing silence, internal silence, clipping and DC offset"""
+        try:
+            header = read_wav_header(path_to_wav)
+        except (OSError, WavChunkError) as e:
+            self.error(path_to_wav, item_id, "wav file could not be read: {}".format(e))
+            return
+        fmt = header["fmt"]
+        if fmt is None or header["data_offset"] is None:
+            # Missing chunks are reported by WAV integrity validation
+            return
+        if fmt["format_tag"] not in PCM_FORMAT_TAGS or fmt["bits_per_sample"] not in PCM_BITS_PER_SAMPLE \
+                or fmt["block_align"] != fmt["channels"] * fmt["bits_per_sample"] // 8 or not fmt["sample_rate"]:
+            self.warn(
+                path_to_wav,
+                item_id,
+                "audio QC only supports 16, 24 and 32-bit PCM; format {} with {} bits per sample was not checked".format(fmt["format_tag"], fmt["bits_per_sample"])
+            )
+            return
+
+        try:
+            frames, silence, clipping, sums = self.analyze_audio(path_to_wav, header)
+        except OSError as e:
+            self.error(path_to_wav, item_id, "wav file could not be read: {}".format(e))
+            return
+        if not frames:
+            return
+        sample_rate = fmt["sample_rate"]
+
+        # Silence at the start or end of the file is reported separately from silence within it
+        leading = silence.first if silence.first and silence.first[0] == 0 else None
+        trailing = silence.last if silence.last and silence.last[1] == frames and silence.last != leading else None
+        edge_runs = [run for run in [leading, trailing] if run]
+        internal_runs = [run for run in silence.runs if run not in edge_runs]
+        internal_count = silence.count - len([run for run in edge_runs if run[1] - run[0] >= silence.min_length])
+        if leading == (0, frames):
+            self.warn(path_to_wav, item_id, "audio is silent for all {:.1f} seconds".format(frames / sample_rate))
+            leading = None
+        for message, run in [("audio begins with {:.1f} seconds of silence", leading), ("audio ends with {:.1f} seconds of silence", trailing)]:
+            if run and (run[1] - run[0]) / sample_rate >= EDGE_SILENCE_SECONDS:
+                self.warn(path_to_wav, item_id, message.format((run[1] - run[0]) / sample_rate))
+
+        self.report_runs(
+            path_to_wav, item_id, internal_runs, internal_count,
+            "silence for {seconds:.1f} seconds at {time}", "silence", sample_rate
+        )
+        self.report_runs(
+            path_to_wav, item_id, clipping.runs, clipping.count,
+            "clipping for {frames} sample frames at {time}", "clipping", sample_rate
+        )
+
+        full_scale = 2 ** (fmt["bits_per_sample"] - 1)
+        for channel, channel_sum in enumerate(sums, start=1):
+            dc_offset = to_dbfs(abs(channel_sum) / frames, full_scale)
+            if dc_offset > DC_OFFSET_THRESHOLD_DBFS:
+                self.warn(path_to_wav, item_id, "channel {} has a DC offset of {:.1f} dBFS".format(channel, dc_offset))
+
+    def check_audio_task(self, task):
+        """
+        Checks a preservation master's audio with a buffered copy of the validator and returns its errors"""
+        path_to_wav, item_id = task
+        worker = self.buffered()
+        worker.check_audio(path_to_wav, item_id)
+        return worker.buffer
+
+    def validate_audio_qc(self):
+        """
+        Checks the audio of every preservation master WAV file
+
+        Each file's data chunk is decoded with NumPy one window at a time, so a file never needs to fit in memory.
+        With more than one worker, files are read by a thread pool, with at most readers_per_device files read at once
+        from each device (see io_scheduler.py); NumPy releases the global interpreter lock while decoding and
+        analyzing each window. Each file's errors are collected in its own buffer and added to the project in path order."""
+        tasks = self.get_paths_to_pms()
+        scheduler = IOScheduler(self.project.entries, workers=self.workers, readers_per_device=self.readers_per_device)
+        buffers = scheduler.map(self.check_audio_task, tasks, [path_to_wav for path_to_wav, _ in tasks])
+        for buffer in tqdm(buffers, total=len(tasks), desc="Audio QC Validation"):
+            self.flush(buffer)
@@ -1,11 +1,30 @@
 import csv
+import hashlib
 import os
+import re
 import sys
 import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from openpyxl import load_workbook
 
 from baroque import defaults
+from baroque.checksum_cache import ChecksumCache
+from baroque.error_store import ErrorStore
+from baroque.validation_cache import ValidationCache
+
+
+# A file or directory found while parsing the source directory, with the stat results validators need
+InventoryEntry = namedtuple("InventoryEntry", ["name", "path", "is_dir", "size", "mtime_ns", "inode", "device"])
+
+# Digital part IDs at the start of part file names (e.g., 85429-SR-1-1 in 85429-SR-1-1-am.wav)
+PART_NAME_REGEX = re.compile(r"\d+\-SR-\d+(\-\d+){1,}")
+# Item file formats that make up a digital part
+PART_FILE_FORMATS = ["md5", "mp3", "wav"]
+
+# Maximum number of directories scanned at the same time while parsing the source directory
+SCAN_WORKERS = 16
 
 
 class BaroqueProject(object):
@@ -23,7 +42,7 @@ class BaroqueProject(object):
     {
         "source": source_directory,
         "destination": destination_directory,
-        "errors": {},
+        "errors": ErrorStore(),
         "shipment" : [
             {
             "id": "",
@@ -51,10 +70,26 @@ class BaroqueProject(object):
                 },
             }
         ],
+        "inventory": {
+            directory path: [InventoryEntry(name, path, is_dir, size, mtime_ns, inode, device)]
+        },
+        "entries": {
+            file or directory path: InventoryEntry(...)
+        },
+        "collections_by_id": {
+            collection id: collection dictionary
+        },
+        "items_by_id": {
+            item id: item dictionary
+        },
     }
+
+    Each directory is listed and each entry is stat-ed once, while the source directory is parsed.
+    Validators read directory listings and file sizes from the inventory instead of the filesystem.
+    Collections and items are also indexed by ID, so validators can look them up without scanning the lists.
     """
 
-    def __init__(self, source_directory, destination_directory, metadata_export):
+    def __init__(self, source_directory, destination_directory, metadata_export, use_cache=True, rehash=False):
         if not os.path.exists(source_directory):
             print("SYSTEM ERROR: source_directory does not exist: {}".format(source_directory))
             sys.exit()
@@ -74,7 +109,18 @@ class BaroqueProject(object):
         self.shipment = []
         self.collections = []
         self.items = []
-        self.errors = {}
+        self.collections_by_id = {}
+        self.items_by_id = {}
+        self.errors = ErrorStore()
+        self.inventory = {}
+        self.entries = {}
+        # Results and metadata export indexes from previous runs
+        self.cache = ValidationCache(destination_directory) if use_cache else None
+        # Checksums computed by previous runs, keyed by the inventory's device, inode, size and mtime
+        # The checksum cache is only opened by get_checksum_cache, when a validation needs it
+        self.use_cache = use_cache
+        self.rehash = rehash
+        self.checksum_cache = None
 
         self.source_type = self.characterize_source_directory()
         print("SYSTEM REPORT: source_directory is {}".format(self.source_type))
@@ -87,6 +133,113 @@ class BaroqueProject(object):
 
         self.metadata = self.parse_metadata_export()
 
+    def get_checksum_cache(self):
+        """
+        Return the checksum cache, opening it the first time it is needed, or None if caching is turned off.
+        """
+        if self.checksum_cache is None and self.use_cache:
+            self.checksum_cache = ChecksumCache(self.destination_directory, rehash=self.rehash)
+        return self.checksum_cache
+
+    def scan_directory(self, directory):
+        """
+        List a directory with os.scandir and record the name, path, type, size, mtime, inode and device of each entry.
+        The device of each entry is the device of the directory it is listed in.
+        Entries are sorted by name so that parsing results do not depend on filesystem order.
+        Each directory is only scanned once; later calls return the recorded entries.
+        """
+        if directory not in self.inventory:
+            entries = []
+            # DirEntry.stat() leaves st_dev as 0 on Windows, so the device (the volume serial number on Windows)
+            # is taken from os.stat() of the directory, once per directory, and recorded for each of its entries
+            device = os.stat(directory).st_dev
+            for dir_entry in os.scandir(directory):
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    # e.g., a broken symbolic link
+                    stat = dir_entry.stat(follow_symlinks=False)
+                entry = InventoryEntry(
+                    dir_entry.name,
+                    dir_entry.path,
+                    dir_entry.is_dir(),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    dir_entry.inode(),
+                    device
+                )
+                entries.append(entry)
+                self.entries[entry.path] = entry
+            entries.sort(key=lambda entry: entry.name)
+            self.inventory[directory] = entries
+
+        return self.inventory[directory]
+
+    def scan_directories(self, directories):
+        """
+        Scan several directories at once with a bounded thread pool.
+        On high-latency network storage this overlaps the round trips of listing and stat-ing each directory.
+        """
+        directories = [directory for directory in directories if directory not in self.inventory]
+        if len(directories) > 1:
+            with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(directories))) as executor:
+                for _ in executor.map(self.scan_directory, directories):
+                    pass
+        else:
+            for directory in directories:
+                self.scan_directory(directory)
+
+    def walk_files(self, directory):
+        """
+        Yield the inventory entry of every file in a directory and its sub-directories, like os.walk.
+        """
+        entries = self.scan_directory(directory)
+        for entry in entries:
+            if not entry.is_dir:
+                yield entry
+        for entry in entries:
+            if entry.is_dir:
+                yield from self.walk_files(entry.path)
+
+    def get_item_file_paths(self, item, file_format):
+        """
+        Take an item and a file format (e.g., "wav") and return the paths to the item's files of that format.
+        """
+        file_names = item["files"][file_format]
+        return [entry.path for entry in self.scan_directory(item["path"]) if entry.name in file_names]
+
+    def get_digital_parts(self):
+        """
+        Group each item's md5, mp3 and wav files, as classified by parse_item, into digital parts by file name.
+        Return a dictionary with the following format:
+            {
+                item id (e.g., 85429-SR-1) :
+                {
+                    part id (e.g., 85429-SR-1-1) : [part files (e.g., 85429-SR-1-1-am.wav)]
+                }
+            }
+        """
+        items = {}
+
+        for item in self.items:
+            for file_type, files in item["files"].items():
+                if file_type in PART_FILE_FORMATS:
+                    for file in files:
+
+                        # Isolate file names without extensions (e.g., "-am.wav").
+                        name_match = PART_NAME_REGEX.match(file)
+                        if name_match:
+                            name = name_match.group()
+
+                            # Create dictionary of intellectual groups
+                            if item["id"] not in items.keys():
+                                items[item["id"]] = {}
+                            if name not in items[item["id"]].keys():
+                                items[item["id"]][name] = []
+                            items[item["id"]][name].append(file)
+
+        return items
+
     def characterize_source_directory(self):
         """
         Characterize the source directory level by analyzing what is inside the source directory.
@@ -96,11 +249,11 @@ class BaroqueProject(object):
         character_directory_files = []
 
         # Loop the source directory to get files and sub-directories and append their name into respective lists
-        for dir_entry in os.scandir(self.source_directory):
-            if dir_entry.is_file():
-                character_directory_files.append(str(dir_entry.name))
-            elif dir_entry.is_dir():
-                character_directory_dirs.append(str(dir_entry.name))
+        for entry in self.scan_directory(self.source_directory):
+            if entry.is_dir:
+                character_directory_dirs.append(entry.name)
+            else:
+                character_directory_files.append(entry.name)
 
         # Return the source directory level as "item", if the lists show the source directory
         # has files and does not have sub-directories
@@ -129,15 +282,22 @@ class BaroqueProject(object):
         and add a dictionary to the "shipment" attribute.
         Then, loop the shipment-level directory for collection-level directories,
         and run "parse_collection" method on each collection-level directory.
+        Collection-level and item-level directories are scanned concurrently before they are parsed in sorted order.
         """
         self.shipment.append({
             "id": os.path.basename(shipment_directory),
             "path": shipment_directory
         })
 
-        for dir_entry in os.scandir(shipment_directory):
-            if dir_entry.is_dir():
-                self.parse_collection(dir_entry.path)
+        collection_directories = [entry.path for entry in self.scan_directory(shipment_directory) if entry.is_dir]
+        self.scan_directories(collection_directories)
+        item_directories = []
+        for collection_directory in collection_directories:
+            item_directories.extend([entry.path for entry in self.scan_directory(collection_directory) if entry.is_dir])
+        self.scan_directories(item_directories)
+
+        for collection_directory in collection_directories:
+            self.parse_collection(collection_directory)
 
     def parse_collection(self, collection_directory):
         """
@@ -145,15 +305,20 @@ class BaroqueProject(object):
         and add a dictionary to the "collections" attribute.
         Then, loop the directory for collection-level directories,
         and run "parse_item" method on each item-level directory.
+        Item-level directories are scanned concurrently before they are parsed in sorted order.
         """
-        self.collections.append({
+        collection = {
             "id": os.path.basename(collection_directory),
             "path": collection_directory
-        })
+        }
+        self.collections.append(collection)
+        self.collections_by_id[collection["id"]] = collection
+
+        item_directories = [entry.path for entry in self.scan_directory(collection_directory) if entry.is_dir]
+        self.scan_directories(item_directories)
 
-        for dir_entry in os.scandir(collection_directory):
-            if dir_entry.is_dir():
-                self.parse_item(dir_entry.path)
+        for item_directory in item_directories:
+            self.parse_item(item_directory)
 
     def parse_item(self, item_directory):
         """
@@ -170,7 +335,8 @@ class BaroqueProject(object):
             "txt": ["txt"]
         }
 
-        for file in os.listdir(item_directory):
+        for entry in self.scan_directory(item_directory):
+            file = entry.name
             other = True
             extension = file.lower().split(".")[-1]
 
@@ -184,25 +350,128 @@ class BaroqueProject(object):
                 files["other"].append(file)
 
         if len(files["wav"]) > 0 or len(files["mp3"]) > 0:
-            self.items.append({
+            item = {
                 "id": os.path.basename(item_directory),
                 "path": item_directory,
                 "files": files
-            })
+            }
+            self.items.append(item)
+            self.items_by_id[item["id"]] = item
         else:
-            self.errors["baroque_project"] = []
             self.add_errors("baroque_project", "warning", item_directory, os.path.basename(item_directory), "item directory does not appear to be an audio recording")
 
     def _parse_collection_id(self, item_id):
         return item_id.split("-")[0] # NOTE: Collection IDs are parsed from item IDs
 
-    def _read_export(self, keys, rows, export_type):
-        for row in rows:
-            if export_type == ".csv":
-                values = row
-            elif export_type == ".xlsx":
-                values = [c.value for c in row]
-            yield dict(zip(keys, values))
+    def _read_export_header(self, export_type):
+        """
+        Return the header row of the metadata export.
+        """
+        rows = self._read_export_rows(export_type)
+        keys = list(next(rows, []))
+        rows.close()
+        return keys
+
+    def _read_export_rows(self, export_type, min_col=None, max_col=None):
+        """
+        Yield the rows of the metadata export one at a time, as sequences of values, without loading the whole export into memory.
+        xlsx exports are read with openpyxl's read-only mode, optionally limited to the columns between min_col and max_col (1-based).
+        """
+        if export_type == ".csv":
+            with open(self.metadata_export, "r", newline="") as f:
+                yield from csv.reader(f)
+
+        elif export_type == ".xlsx":
+            # momentarily set warnings to ignore to hide openpyxl's "UserWarning: Workbook contains no default style" message
+            warnings.simplefilter("ignore")
+            workbook = load_workbook(self.metadata_export, read_only=True)
+            warnings.simplefilter("default")
+            try:
+                sheet = workbook.active
+                # Don't trust the dimensions recorded by the exporting application
+                sheet.reset_dimensions()
+                yield from sheet.iter_rows(min_col=min_col, max_col=max_col, values_only=True)
+            finally:
+                workbook.close()
+
+    def _hash_export(self):
+        """
+        Return a SHA-256 digest of the metadata export's contents.
+        """
+        sha256 = hashlib.sha256()
+        with open(self.metadata_export, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def _read_export_values(self, export_type, keys, column_mapping):
+        """
+        Yield an (item id, collection title, item title, item date) tuple for each row of the metadata export.
+        column_mapping lists the item id, collection title, item title and item date column names.
+        """
+        # Only read the needed columns. If a column name appears more than once, the last one is used.
+        column_positions = {key: position for position, key in enumerate(keys)}
+        positions = [column_positions.get(column) for column in column_mapping]
+        found_positions = [position for position in positions if position is not None]
+        if export_type == ".xlsx" and found_positions:
+            first_position = min(found_positions)
+            rows = self._read_export_rows(export_type, min_col=first_position + 1, max_col=max(found_positions) + 1)
+        else:
+            first_position = 0
+            rows = self._read_export_rows(export_type)
+        positions = [position - first_position if position is not None else None for position in positions]
+
+        next(rows, None) # Skip the header row
+        row_counter = 1
+
+        try:
+            for row in rows:
+                row_counter += 1
+                values = tuple(row[position] if position is not None and position < len(row) else None for position in positions)
+                self.check_values_exist("item id (DigFile Calc)", values[0], row_counter)
+                yield values
+        finally:
+            rows.close()
+
+    def _get_source_collections_ids(self):
+        """
+        Return the IDs of the collections the source directory's items belong to, or None for a shipment.
+        """
+        if self.source_type == "item":
+            return set(self._parse_collection_id(item["id"]) for item in self.items)
+        elif self.source_type == "collection":
+            return set(collection["id"] for collection in self.collections)
+        else:
+            return None
+
+    def _build_metadata(self, export_values):
+        """
+        Build the metadata for the source directory from (item id, collection title, item title, item date) tuples.
+        """
+        metadata = {"collections_ids": [], "items_ids": [], "item_metadata": {}}
+
+        # Hash-set indexes of the items and collections found in the source directory
+        source_items_ids = set(item["id"] for item in self.items)
+        source_collections_ids = set(collection["id"] for collection in self.collections)
+        collections_ids = set()
+
+        for item_id, collection_title, item_title, item_date in export_values:
+            if self.source_type == "item" and item_id not in source_items_ids:
+                continue
+            collection_id = self._parse_collection_id(item_id)
+            if self.source_type == "collection" and collection_id not in source_collections_ids:
+                continue
+            metadata["items_ids"].append(item_id)
+            if collection_id not in collections_ids:
+                collections_ids.add(collection_id)
+                metadata["collections_ids"].append(collection_id)
+            metadata["item_metadata"][item_id] = {
+                "collection_title": collection_title,
+                "item_title": item_title,
+                "item_date": item_date
+            }
+
+        return metadata
 
     def check_values_exist(self, value_name, value_var, row_counter):
         if not value_var:
@@ -216,8 +485,6 @@ class BaroqueProject(object):
         """
         metadata_export = self.metadata_export
 
-        metadata = {"collections_ids": [], "items_ids": [], "item_metadata": {}}
-
         column_headers = {
             "item_id_column" : "DigFile Calc",
             "collection_title_column" : "COLLECTIONS::CollectionTitle",
@@ -227,22 +494,7 @@ class BaroqueProject(object):
 
         export_type = os.path.splitext(metadata_export)[1]
         if export_type in [".csv", ".xlsx"]:
-            if export_type == ".csv":
-                with open(metadata_export, "r", newline="") as f:
-                    reader = csv.reader(f)
-                    keys = next(reader)
-                    rows = [row for row in reader]
-
-            elif export_type == ".xlsx":
-                # momentarily set warnings to ignore to hide openpyxl's "UserWarning: Workbook contains no default style" message
-                warnings.simplefilter("ignore")
-                workbook = load_workbook(metadata_export)
-                warnings.simplefilter("default")
-                sheet = workbook.active
-                reader = sheet.rows
-                keys = [c.value for c in next(reader)]
-                rows = [row for row in reader]
-                workbook.close()
+            keys = self._read_export_header(export_type)
 
             for header in column_headers.keys():
                 if column_headers[header] not in keys:
@@ -253,32 +505,24 @@ class BaroqueProject(object):
                     else:
                         print("SYSTEM REPORT: '{}' column not found, will not compare".format(column_headers[header]))
 
-            item_id_column = column_headers["item_id_column"]
-            collection_title_column = column_headers["collection_title_column"]
-            item_title_column = column_headers["item_title_column"]
-            item_date_column = column_headers["item_date_column"]
-            row_counter = 1
+            column_mapping = [column_headers[header] for header in [
+                "item_id_column", "collection_title_column", "item_title_column", "item_date_column"
+                ]]
+            export_values = None
+            if self.cache:
+                # Reuse the export's index from a previous run, loading only the needed collections
+                export_hash = self._hash_export()
+                export_values = self.cache.get_export_index(metadata_export, export_hash, column_mapping, self._get_source_collections_ids())
+                if export_values is None:
+                    export_values = list(self._read_export_values(export_type, keys, column_mapping))
+                    collections_values = {}
+                    for position, values in enumerate(export_values):
+                        collections_values.setdefault(self._parse_collection_id(values[0]), []).append((position, values))
+                    self.cache.put_export_index(metadata_export, export_hash, column_mapping, collections_values)
+            else:
+                export_values = self._read_export_values(export_type, keys, column_mapping)
 
-            for row in self._read_export(keys, rows, export_type):
-                row_counter += 1
-                item_id = row.get(item_id_column)
-                self.check_values_exist("item id (DigFile Calc)", item_id, row_counter)
-                if self.source_type == "item" and item_id not in [item["id"] for item in self.items]:
-                    continue
-                collection_id = self._parse_collection_id(item_id)
-                if self.source_type == "collection" and collection_id not in [collection["id"] for collection in self.collections]:
-                    continue
-                collection_title = row.get(collection_title_column)
-                item_title = row.get(item_title_column)
-                item_date = row.get(item_date_column)
-                metadata["items_ids"].append(item_id)
-                if collection_id not in metadata["collections_ids"]:
-                    metadata["collections_ids"].append(collection_id)
-                metadata["item_metadata"][item_id] = {
-                    "collection_title": collection_title,
-                    "item_title": item_title,
-                    "item_date": item_date
-                }
+            metadata = self._build_metadata(export_values)
 
         # File type: neither csv nor xlsx
         else:
@@ -289,9 +533,8 @@ class BaroqueProject(object):
 
     def add_errors(self, validation, error_type, path, id, error):
         """
-        Add errors, organized by validation, to the BaroqueProject error attribute.
-        Each validation (e.g., structure) has its own list of errors.
-        Each error message is a dictionary with five key, value pairs:
+        Add errors, organized by validation, to the BaroqueProject error store (see baroque/error_store.py).
+        Each error has five values:
         - validation : the validation step where the error was found
         - error_type : classification of the errror (either "requirement" or "warning")
         - path : where the error occurs (e.g., "C:\\Users\\person\\Desktop\\2019103\\12345")
@@ -299,10 +542,4 @@ class BaroqueProject(object):
         - error : a message describing the error (e.g., "empty directory", "empty file")
         """
 
-        self.errors[validation].append({
-                "validation": validation,
-                "error_type": error_type, # NOTE: Needs to be "requirement" or "warning".
-                "path": path,
-                "id": id,
-                "error": error
-            })
+        self.errors.add(validation, error_type, path, id, error) # NOTE: error_type needs to be "requirement" or "warning".
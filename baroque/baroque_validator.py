@@ -1,18 +1,41 @@
+import copy
+
+
 class BaroqueValidator:
     def __init__(self, validation, validator, project):
         self.validation = validation
         self.validator = validator
         self.project = project
-        if self.validation not in self.project.errors.keys():
-            self.project.errors[validation] = []
+        self.buffer = None
+        self.project.errors.register(validation)
 
     def validate(self):
         self.validator()
-    
+
+    def buffered(self):
+        """
+        Returns a copy of the validator that collects errors in its own buffer instead of adding them to the project.
+        Copies have their own per-item state, so they can run concurrently."""
+        worker = copy.copy(self)
+        worker.buffer = []
+        return worker
+
+    def flush(self, buffer):
+        """
+        Adds errors collected by a buffered copy of the validator to the project"""
+        for error_type, path, id, message in buffer:
+            self.project.add_errors(self.validation, error_type, path, id, message)
+
+    def add_error(self, error_type, path, id, message):
+        if self.buffer is None:
+            self.project.add_errors(self.validation, error_type, path, id, message)
+        else:
+            self.buffer.append((error_type, path, id, message))
+
     def error(self, path, id, message):
         error_type = "requirement"
-        self.project.add_errors(self.validation, error_type, path, id, message)
+        self.add_error(error_type, path, id, message)
 
     def warn(self, path, id, message):
         error_type = "warning"
-        self.project.add_errors(self.validation, error_type, path, id, message)
+        self.add_error(error_type, path, id, message)
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+
+from .utils import is_path_under
+
+
+CHECKSUM_CACHE_FILENAME = "baroque-checksums.db"
+
+
+class ChecksumCache:
+    """
+    Stores file checksums in an SQLite database in the destination directory, so that files that have not
+    changed since a previous run are not read again by fixity checks.
+
+    Checksums are keyed by the file's device and inode (or its path, where either is not reported) and
+    the hashing algorithm, and are only reused when the file's size and mtime, taken from the BaroqueProject
+    inventory, are unchanged. A file that is renamed or moved within a device keeps its checksum.
+
+    With rehash, stored checksums are never reused, but newly computed checksums are still stored.
+    Stored checksums can also be removed for good with invalidate (the --invalidate-checksums option).
+    """
+
+    def __init__(self, destination_directory, rehash=False):
+        self.path = os.path.join(destination_directory, CHECKSUM_CACHE_FILENAME)
+        self.rehash = rehash
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "file_key TEXT, algorithm TEXT, size INTEGER, mtime_ns INTEGER, digest TEXT, path TEXT, "
+            "PRIMARY KEY (file_key, algorithm))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def file_key(self, entry):
+        """
+        Returns the key identifying an inventory entry's file: its device and inode, or its path if either is unknown
+        Inode numbers (NTFS file IDs on Windows) are only unique within a volume, so they are never used without a device"""
+        if entry.device and entry.inode:
+            return "{}:{}".format(entry.device, entry.inode)
+        return entry.path
+
+    def get(self, entry, algorithm):
+        """
+        Returns the stored checksum for an inventory entry, or None if there is no checksum for its current size and mtime"""
+        row = None
+        if not self.rehash:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, digest, path FROM checksums WHERE file_key = ? AND algorithm = ?",
+                (self.file_key(entry), algorithm)
+            ).fetchone()
+        if row is None or tuple(row[:2]) != (entry.size, entry.mtime_ns):
+            self.misses += 1
+            return None
+
+        if row[3] != entry.path:
+            # The file has been renamed or moved; record its new path so that it is not evicted
+            self.connection.execute(
+                "UPDATE checksums SET path = ? WHERE file_key = ? AND algorithm = ?",
+                (entry.path, self.file_key(entry), algorithm)
+            )
+            self.connection.commit()
+        self.hits += 1
+        return row[2]
+
+    def put(self, entry, algorithm, digest):
+        """
+        Stores the checksum computed for an inventory entry
+        Each checksum is committed immediately, since computing it can take minutes for large files"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?)",
+            (self.file_key(entry), algorithm, entry.size, entry.mtime_ns, digest, entry.path)
+        )
+        self.connection.commit()
+
+    def invalidate(self, path=None):
+        """
+        Removes the stored checksums for a file or for every file in a directory, or all stored checksums if no path is given
+        Returns the number of files whose checksums were removed"""
+        if path is None:
+            invalidated = self.connection.execute("SELECT COUNT(DISTINCT path) FROM checksums").fetchone()[0]
+            self.connection.execute("DELETE FROM checksums")
+        else:
+            paths = [row[0] for row in self.connection.execute("SELECT DISTINCT path FROM checksums")]
+            invalidated_paths = [(stored_path,) for stored_path in paths if is_path_under(stored_path, path)]
+            self.connection.executemany("DELETE FROM checksums WHERE path = ?", invalidated_paths)
+            invalidated = len(invalidated_paths)
+        self.connection.commit()
+        return invalidated
+
+    def evict_missing(self, source_directory, known_paths):
+        """
+        Removes checksums for files under the source directory that no longer exist
+        Only paths under source_directory are considered, and a path is missing if it is not in known_paths
+        (the BaroqueProject inventory). The filesystem is never checked, so checksums for files on volumes that
+        are offline are kept."""
+        paths = [row[0] for row in self.connection.execute("SELECT DISTINCT path FROM checksums")]
+        missing = [(path,) for path in paths if path not in known_paths and is_path_under(path, source_directory)]
+        self.connection.executemany("DELETE FROM checksums WHERE path = ?", missing)
+        self.connection.commit()
+        return len(missing)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
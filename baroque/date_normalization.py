@@ -0,0 +1,122 @@
+import calendar
+from collections import OrderedDict
+from datetime import datetime, timezone
+import re
+import threading
+
+import dateparser
+from dateparser.date import DateDataParser
+
+
+# Formats handled without calling dateparser, e.g. "2019-05-20" or "2019/05/20", "2019-05", "1975" and "12:04:58"
+YEAR_MONTH_DAY_REGEX = re.compile(r"(\d{4})([-/])(\d{2})\2(\d{2})")
+YEAR_MONTH_REGEX = re.compile(r"(\d{4})[-/](\d{2})")
+YEAR_REGEX = re.compile(r"\d{4}")
+TIME_REGEX = re.compile(r"(\d{2}):(\d{2}):(\d{2})")
+UNDATED_VALUES = ["undated"]
+
+# Maximum number of fallback results kept in memory
+DATE_CACHE_SIZE = 4096
+
+# dateparser tries English first when detecting the language of a date, so a date it parses as English
+# is parsed the same way without language detection, which is much slower
+_english_parser = DateDataParser(languages=["en"])
+_date_cache = OrderedDict()
+_date_cache_lock = threading.Lock()
+
+
+def _utcnow():
+    """
+    Helper function to get the current date and time the way dateparser does, as a naive UTC datetime"""
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+def _clip_day(year, month, day):
+    """
+    Helper function to use the last day of the month when a day is out of range (e.g., the 31st in June)"""
+    return min(day, calendar.monthrange(year, month)[1])
+
+
+def _parse_fast(date_string):
+    """
+    Parses the date formats found in metadata exports, METS and BEXT chunks without calling dateparser
+    Returns a (matched, datetime or None) tuple, where matched is False if date_string needs to be parsed by dateparser
+
+    Missing parts of a date are filled in from the current date, as dateparser does (e.g., "1975" is parsed as
+    the current month and day in 1975)"""
+    if date_string.lower() in UNDATED_VALUES:
+        return True, None
+
+    match = YEAR_MONTH_DAY_REGEX.fullmatch(date_string)
+    if match:
+        year, month, day = int(match.group(1)), int(match.group(3)), int(match.group(4))
+        # Leave invalid dates (e.g., "2019-13-01", which dateparser reads as January 13th) to dateparser
+        if year > 0 and 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]:
+            return True, datetime(year, month, day)
+        return False, None
+
+    match = YEAR_MONTH_REGEX.fullmatch(date_string)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        if year > 0 and 1 <= month <= 12:
+            return True, datetime(year, month, _clip_day(year, month, _utcnow().day))
+        return False, None
+
+    if YEAR_REGEX.fullmatch(date_string):
+        year = int(date_string)
+        # Leave year 0 to dateparser, whose result depends on its version
+        if year == 0:
+            return False, None
+        now = _utcnow()
+        return True, datetime(year, now.month, _clip_day(year, now.month, now.day))
+
+    match = TIME_REGEX.fullmatch(date_string)
+    if match:
+        hour, minute, second = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        if hour < 24 and minute < 60 and second < 60:
+            return True, _utcnow().replace(hour=hour, minute=minute, second=second, microsecond=0)
+        return False, None
+
+    return False, None
+
+
+def _parse_fallback(date_string):
+    """
+    Parses a date with dateparser, trying English before detecting the language
+    Dates without words (e.g., "120458") are left to language detection, which decides their day and month order"""
+    date = None
+    if any(character.isalpha() for character in date_string):
+        date = _english_parser.get_date_data(date_string)["date_obj"]
+    if date is None:
+        date = dateparser.parse(date_string)
+
+    return date
+
+
+def normalize_date(date_string):
+    """
+    Parses a date or time string into a datetime, or None if it is not a date, giving the same results as dateparser.parse
+
+    Common formats are parsed directly. Other strings are parsed by dateparser and the results are kept in a bounded
+    LRU cache, except for dates dateparser reads as relative to the current time (e.g., "1970s")."""
+    if date_string is None:
+        return None
+
+    stripped = date_string.strip()
+    matched, date = _parse_fast(stripped)
+    if matched:
+        return date
+
+    with _date_cache_lock:
+        if date_string in _date_cache:
+            _date_cache.move_to_end(date_string)
+            return _date_cache[date_string]
+
+    date = _parse_fallback(date_string)
+    if date is None or date.microsecond == 0:
+        with _date_cache_lock:
+            _date_cache[date_string] = date
+            if len(_date_cache) > DATE_CACHE_SIZE:
+                _date_cache.popitem(last=False)
+
+    return date
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+from .baroque_validator import BaroqueValidator
+from .mp3_frames import Mp3FrameError, read_mp3_frames
+from .utils import format_time
+from .wav_chunks import read_wav_header, WavChunkError
+
+
+# Largest difference in seconds allowed between the durations of the files in a digital part;
+# MP3 encoder delay and padding add a fraction of a second to access copies
+DURATION_TOLERANCE_SECONDS = 1
+
+
+class DurationValidator(BaroqueValidator):
+    def __init__(self, project, workers=1):
+        validation = "duration"
+        validator = self.validate_durations
+        super().__init__(validation, validator, project)
+        self.workers = workers
+
+    def get_wav_duration(self, path_to_wav):
+        """
+        Returns the duration in seconds of the audio in a WAV file's data chunk, from its header"""
+        header = read_wav_header(path_to_wav)
+        fmt = header["fmt"]
+        if fmt is None or header["data_offset"] is None or not fmt["block_align"] or not fmt["sample_rate"]:
+            return None
+        # Only the audio data that is actually in the file counts towards a truncated file's duration
+        data_size = min(header["data_size"], header["file_size"] - header["data_offset"])
+        return data_size // fmt["block_align"] / fmt["sample_rate"]
+
+    def get_mp3_duration(self, path_to_mp3):
+        """
+        Returns the duration in seconds of an MP3 file, from its frame headers"""
+        return read_mp3_frames(path_to_mp3)["duration"]
+
+    def check_part_durations(self, item, part_id, part_files):
+        """
+        Checks that the WAV and MP3 files in a digital part (e.g., 85429-SR-1-1-am.wav, 85429-SR-1-1-pm.wav and
+        85429-SR-1-1.mp3) have the same duration, within DURATION_TOLERANCE_SECONDS"""
+        durations = []
+        for file in sorted(part_files):
+            path = os.path.join(item["path"], file)
+            try:
+                if file in item["files"]["wav"]:
+                    duration = self.get_wav_duration(path)
+                elif file in item["files"]["mp3"]:
+                    duration = self.get_mp3_duration(path)
+                else:
+                    continue
+            except (OSError, ValueError, WavChunkError, Mp3FrameError):
+                # Unreadable files are reported by WAV integrity and MP3 validation
+                continue
+            if duration is not None:
+                durations.append((file, duration))
+
+        if len(durations) < 2:
+            return
+        shortest = min(duration for _, duration in durations)
+        longest = max(duration for _, duration in durations)
+        if longest - shortest > DURATION_TOLERANCE_SECONDS:
+            self.error(
+                item["path"],
+                item["id"],
+                "digital part {} has files whose durations differ by {:.1f} seconds: {}".format(
+                    part_id,
+                    longest - shortest,
+                    ", ".join("{} ({})".format(file, format_time(duration)) for file, duration in durations)
+                )
+            )
+
+    def check_part_durations_task(self, task):
+        """
+        Checks a digital part's durations with a buffered copy of the validator and returns its errors"""
+        worker = self.buffered()
+        worker.check_part_durations(*task)
+        return worker.buffer
+
+    def validate_durations(self):
+        """
+        Validates that the files in each digital part have the same duration
+
+        Digital parts are grouped once by BaroqueProject.get_digital_parts, and each part's WAV and MP3 files are
+        read together. Durations come from headers only: the fmt and data chunk headers of WAV files and the frame
+        headers of MP3 files. With more than one worker, parts are read by a thread pool.
+        Each part's errors are collected in its own buffer and added to the project in item and part order."""
+        digital_parts = self.project.get_digital_parts()
+        tasks = []
+        for item_id in sorted(digital_parts):
+            item = self.project.items_by_id[item_id]
+            for part_id in sorted(digital_parts[item_id]):
+                tasks.append((item, part_id, digital_parts[item_id][part_id]))
+
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            if self.workers > 1:
+                buffers = executor.map(self.check_part_durations_task, tasks)
+            else:
+                buffers = map(self.check_part_durations_task, tasks)
+
+            for buffer in tqdm(buffers, total=len(tasks), desc="Duration Validation"):
+                self.flush(buffer)
@@ -0,0 +1,119 @@
+from array import array
+from collections import namedtuple
+
+
+ERROR_TYPES = ["requirement", "warning"]
+
+# A single error, as written to the error report
+BaroqueError = namedtuple("BaroqueError", ["validation", "error_type", "path", "id", "error"])
+
+
+class ErrorsNotStoredError(RuntimeError):
+    pass
+
+
+class ErrorStore:
+    """
+    Stores the errors found by each validation in column arrays rather than one dictionary per error.
+
+    Validations, error types, paths, IDs and messages repeat across many errors (e.g., the same BEXT message
+    for every WAV file in a shipment), so each distinct string is stored once and shared between errors.
+    Errors are indexed by validation as they are added, and the number of errors of each type is counted per
+    validation, so reports do not need to scan the errors.
+
+    Once a sink (e.g., a ReportWriter) is attached, errors are written to the sink as they are added instead of
+    being kept in memory, and only the counters are kept. Reading errors back from the store then raises
+    ErrorsNotStoredError rather than returning an incomplete list; read them from the sink's report instead.
+    """
+
+    def __init__(self):
+        self.validations = []
+        self.counts = {}
+        self.total = 0
+        self.sink = None
+        self._strings = {}
+        self._columns = BaroqueError([], [], [], [], [])
+        self._by_validation = {}
+
+    def __len__(self):
+        return self.total
+
+    def _intern(self, value):
+        """
+        Helper function to share one copy of each distinct string between errors"""
+        if not isinstance(value, str):
+            return value
+        return self._strings.setdefault(value, value)
+
+    def register(self, validation):
+        """
+        Adds a validation to the store, so that it is reported even if it finds no errors
+        Validations are reported in the order they are registered"""
+        if validation not in self.counts:
+            validation = self._intern(validation)
+            self.validations.append(validation)
+            self.counts[validation] = {error_type: 0 for error_type in ERROR_TYPES}
+            self._by_validation[validation] = array("L")
+
+    def attach(self, sink):
+        """
+        Writes errors to sink as they are added, instead of keeping them in memory
+        Errors that have already been stored are written to sink first"""
+        for error in self:
+            sink.write(error)
+        self.sink = sink
+        self._strings = {}
+        self._columns = BaroqueError([], [], [], [], [])
+        self._by_validation = {validation: array("L") for validation in self.validations}
+
+    def add(self, validation, error_type, path, id, error):
+        if validation not in self.counts:
+            self.register(validation)
+        counts = self.counts[validation]
+        counts[error_type] = counts.get(error_type, 0) + 1
+        self.total += 1
+        if self.sink is not None:
+            self.sink.write(BaroqueError(validation, error_type, path, id, error))
+            return
+
+        strings = self._strings
+        columns = self._columns
+        position = len(columns.error)
+        validation = strings.setdefault(validation, validation)
+        columns.validation.append(validation)
+        columns.error_type.append(strings.setdefault(error_type, error_type))
+        columns.path.append(self._intern(path))
+        columns.id.append(self._intern(id))
+        columns.error.append(self._intern(error))
+
+        self._by_validation[validation].append(position)
+
+    def count(self, validation, error_type):
+        return self.counts.get(validation, {}).get(error_type, 0)
+
+    def _get(self, positions):
+        columns = self._columns
+        for position in positions:
+            yield BaroqueError(*(column[position] for column in columns))
+
+    def _check_stored(self):
+        """
+        Helper function to refuse to read errors back once they are written to a sink instead of being stored"""
+        if self.sink is not None:
+            raise ErrorsNotStoredError(
+                "errors are written to {} instead of being stored; read them from the report".format(getattr(self.sink, "path", "a sink"))
+            )
+
+    def by_validation(self, validation):
+        """
+        Returns the errors found by a validation, in the order they were added
+        Raises ErrorsNotStoredError once a sink is attached"""
+        self._check_stored()
+        return self._get(self._by_validation.get(validation, []))
+
+    def __iter__(self):
+        """
+        Returns all errors, grouped by validation
+        Raises ErrorsNotStoredError once a sink is attached"""
+        self._check_stored()
+        return (error for validation in self.validations for error in self._get(self._by_validation[validation]))
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import re
+from tqdm import tqdm
+
+from .baroque_validator import BaroqueValidator
+from .io_scheduler import DEFAULT_READERS_PER_DEVICE, IOScheduler
+
+
+# Files are hashed in 8 MiB reads; hashlib releases the GIL while hashing large reads, so threads hash in parallel
+FIXITY_READ_SIZE = 8 * 1024 * 1024
+MD5_REGEX = re.compile(r"\b[0-9a-fA-F]{32}\b")
+
+
+def hash_file(path, algorithm="md5"):
+    """
+    Hashes a file with a reusable read buffer and returns its hexadecimal digest"""
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(FIXITY_READ_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+
+    return digest.hexdigest()
+
+
+class FixityValidator(BaroqueValidator):
+    def __init__(self, project, workers=1, readers_per_device=DEFAULT_READERS_PER_DEVICE):
+        validation = "fixity"
+        validator = self.validate_fixity
+        super().__init__(validation, validator, project)
+        self.workers = workers
+        self.readers_per_device = readers_per_device
+
+    def get_paths_to_md5s(self):
+        """
+        Returns the paths to every item's .md5 sidecar files (e.g., 85429-SR-1-1-am.wav.md5), sorted by path"""
+        paths_to_md5s = []
+        for item in self.project.items:
+            paths_to_md5s.extend(self.project.get_item_file_paths(item, "md5"))
+
+        return sorted(paths_to_md5s)
+
+    def read_md5_file(self, path_to_md5):
+        """
+        Returns the MD5 checksum in an .md5 sidecar file, which may be followed by a file name, or None if there is none"""
+        with open(path_to_md5, "r", encoding="utf-8", errors="replace") as f:
+            md5_match = MD5_REGEX.search(f.read())
+
+        return md5_match.group().lower() if md5_match else None
+
+    def get_path_to_file(self, path_to_md5):
+        """
+        Returns the path to the file an .md5 sidecar file describes, which is its path without the .md5 extension"""
+        return path_to_md5[:-len(".md5")]
+
+    def check_fixity(self, path_to_md5, cached_md5=None):
+        """
+        Checks a file against the MD5 checksum in its .md5 sidecar file (e.g., 85429-SR-1-1-am.wav against 85429-SR-1-1-am.wav.md5)
+        If cached_md5 is given, it is used as the file's checksum instead of reading the file
+        Returns the file's checksum, or None if it could not be computed"""
+        md5_name = os.path.basename(path_to_md5)
+        try:
+            expected_md5 = self.read_md5_file(path_to_md5)
+        except OSError as e:
+            self.error(path_to_md5, md5_name, "md5 file could not be read: {}".format(e))
+            return None
+        if expected_md5 is None:
+            self.error(path_to_md5, md5_name, "md5 file does not contain an md5 checksum")
+            return None
+
+        path_to_file = self.get_path_to_file(path_to_md5)
+        file_name = os.path.basename(path_to_file)
+        if path_to_file not in self.project.entries:
+            self.error(path_to_md5, md5_name, "file for md5 file not found: '{}'".format(file_name))
+            return None
+
+        actual_md5 = cached_md5
+        if actual_md5 is None:
+            try:
+                actual_md5 = hash_file(path_to_file)
+            except OSError as e:
+                self.error(path_to_file, file_name, "file could not be read: {}".format(e))
+                return None
+        if actual_md5 != expected_md5:
+            self.error(
+                path_to_file,
+                file_name,
+                "md5 checksum {} does not match {} in '{}'".format(actual_md5, expected_md5, md5_name)
+            )
+
+        return actual_md5
+
+    def check_fixity_task(self, task):
+        """
+        Checks a file's fixity with a buffered copy of the validator
+        Returns the file's errors and checksum"""
+        path_to_md5, cached_md5 = task
+        worker = self.buffered()
+        md5 = worker.check_fixity(path_to_md5, cached_md5)
+        return worker.buffer, md5
+
+    def validate_fixity(self):
+        """
+        Validates the fixity of every file with an .md5 sidecar file
+
+        With more than one worker, files are hashed by a thread pool so that several files are read at once,
+        with at most readers_per_device files read at once from each device (see io_scheduler.py).
+        Each file's errors are collected in its own buffer and added to the project in path order.
+        Files whose checksums are in the project's checksum cache are not read again; new checksums are added to the cache."""
+        checksum_cache = self.project.get_checksum_cache()
+        tasks = []
+        for path_to_md5 in self.get_paths_to_md5s():
+            entry = self.project.entries.get(self.get_path_to_file(path_to_md5))
+            cached_md5 = None
+            if checksum_cache and entry and not entry.is_dir:
+                cached_md5 = checksum_cache.get(entry, "md5")
+            tasks.append((path_to_md5, cached_md5))
+
+        scheduler = IOScheduler(self.project.entries, workers=self.workers, readers_per_device=self.readers_per_device)
+        results = scheduler.map(self.check_fixity_task, tasks, [self.get_path_to_file(path_to_md5) for path_to_md5, _ in tasks])
+        for (path_to_md5, cached_md5), (buffer, md5) in tqdm(zip(tasks, results), total=len(tasks), desc="Fixity Validation"):
+            if checksum_cache and md5 is not None and cached_md5 is None:
+                checksum_cache.put(self.project.entries[self.get_path_to_file(path_to_md5)], "md5", md5)
+            self.flush(buffer)
@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import deque
+
+
+# Maximum number of files read at the same time from one device, unless set with --readers-per-device
+DEFAULT_READERS_PER_DEVICE = 2
+
+
+class IOScheduler:
+    """
+    Runs tasks that read whole files on a pool of threads, limiting the number of files read at once from each device.
+
+    Many readers on one spinning disk or USB drive make it seek between files and lower its throughput, while a
+    NAS or SSD can serve several readers at once. Tasks are grouped by the device (st_dev) of the file they read,
+    taken from the BaroqueProject inventory, and ordered by directory so that files in the same directory are read
+    one after another. Idle threads take the next task from a device that has fewer than readers_per_device readers,
+    so a busy device does not hold up reads from the other devices.
+    """
+
+    def __init__(self, entries, workers=1, readers_per_device=DEFAULT_READERS_PER_DEVICE):
+        self.entries = entries
+        self.workers = max(workers, 1)
+        self.readers_per_device = max(readers_per_device, 1)
+
+    def get_device(self, path):
+        """
+        Returns the device of a file from the inventory, or from the filesystem if the file is not in the inventory"""
+        entry = self.entries.get(path)
+        if entry is not None:
+            return entry.device
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return None
+
+    def map(self, function, tasks, paths):
+        """
+        Runs function on each task, where paths[i] is the file read by tasks[i]
+        Yields the results in the order of tasks, like ThreadPoolExecutor.map"""
+        queues = {}
+        for index in sorted(range(len(tasks)), key=lambda index: (os.path.dirname(paths[index]), paths[index])):
+            queues.setdefault(self.get_device(paths[index]), deque()).append(index)
+        devices = deque(queues.keys())
+        readers = {device: 0 for device in devices}
+        results = {}
+        state = {"cancelled": False}
+        condition = threading.Condition()
+
+        def next_task():
+            # Called with the condition held; returns (device, index), or None when there are no more tasks
+            while not state["cancelled"] and devices:
+                for _ in range(len(devices)):
+                    device = devices[0]
+                    devices.rotate(-1)
+                    if readers[device] < self.readers_per_device:
+                        index = queues[device].popleft()
+                        if not queues[device]:
+                            devices.remove(device)
+                        readers[device] += 1
+                        return device, index
+                condition.wait()
+            return None
+
+        def worker():
+            while True:
+                with condition:
+                    task = next_task()
+                if task is None:
+                    return
+                device, index = task
+                try:
+                    result = (True, function(tasks[index]))
+                except BaseException as e:
+                    result = (False, e)
+                with condition:
+                    readers[device] -= 1
+                    results[index] = result
+                    condition.notify_all()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.workers, len(tasks)))]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for index in range(len(tasks)):
+                with condition:
+                    while index not in results:
+                        condition.wait()
+                    succeeded, result = results.pop(index)
+                if not succeeded:
+                    raise result
+                yield result
+        finally:
+            # If the caller stops early (e.g., on an interrupt), threads finish their current task and exit
+            with condition:
+                state["cancelled"] = True
+                condition.notify_all()
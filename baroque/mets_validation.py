@@ -1,11 +1,12 @@
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
-import dateparser
 import sys
 from tqdm import tqdm
 
 from .baroque_validator import BaroqueValidator
+from .date_normalization import normalize_date
 from .utils import sanitize_text
 
 # Note: Some namespaces referenced in the example XML files are not used in the METS file. Unless I'm missing some, these are: fits, fn, rights, marc21 and  tcf.
@@ -18,12 +19,60 @@ namespaces = {
     'xlink': 'http://www.w3.org/1999/xlink'
 }
 
+# Descendants of amdSec sections that are kept when streaming METS; everything else (e.g., AES process history)
+# is discarded as soon as it is parsed, since the amdSec validation does not look at it
+STREAMING_AMDSEC_KEEP_TAGS = {
+    "{" + namespaces['mets'] + "}mdWrap",
+    "{" + namespaces['mets'] + "}xmlData",
+    "{" + namespaces['mets'] + "}mdRef",
+    "{" + namespaces['aes'] + "}audioObject",
+    "{" + namespaces['aes'] + "}primaryIdentifier",
+}
+
+# XPath expressions compiled with the namespaces above, keyed by path string
+_compiled_paths = {}
+
+
+def compile_path(path):
+    """
+    Returns a compiled etree.XPath for a path string
+    Each path is compiled once per process and reused for every item"""
+    compiled_path = _compiled_paths.get(path)
+    if compiled_path is None:
+        compiled_path = etree.XPath(path, namespaces=namespaces)
+        _compiled_paths[path] = compiled_path
+    return compiled_path
+
+
+# Buffered MetsValidator used by each process in the METS validation process pool
+_worker_validator = None
+
+
+def _init_worker(validator):
+    global _worker_validator
+    _worker_validator = validator
+
+
+def _validate_item_mets_task(task):
+    """
+    Validates one item's METS in a process pool worker and returns the item's errors"""
+    item, item_metadata = task
+    worker = _worker_validator.buffered()
+    worker.validate_item_mets(item, item_metadata)
+    return worker.buffer
+
 
 class MetsValidator(BaroqueValidator):
-    def __init__(self, project):
+    # Increase whenever the checks change, so results cached by earlier versions are not reused
+    cache_version = 1
+
+    def __init__(self, project, processes=1, streaming=False):
         validation = "mets"
         validator = self.validate_mets
         super().__init__(validation, validator, project)
+        # 0 uses one process per CPU core
+        self.processes = processes
+        self.streaming = streaming
 
     def check_tag_text(self, tag, argument, value=None):
         """
@@ -78,7 +127,13 @@ class MetsValidator(BaroqueValidator):
     def check_element_exists(self, element_path):
         """
         Helper function to check if a specific element exists"""
-        elements = self.tree.xpath(element_path, namespaces=namespaces)
+        if element_path in self.sections:
+            elements = self.sections[element_path]
+        elif element_path.startswith("/mets:mets/mets:") and element_path.count("/") == 2:
+            # Top-level sections missing from the index do not exist
+            elements = []
+        else:
+            elements = compile_path(element_path)(self.tree)
         element = None
         exists = True
         if len(elements) == 0:
@@ -105,7 +160,7 @@ class MetsValidator(BaroqueValidator):
         Helper function that checks if one or more of a given subelement exist
         Optionally takes an expected parameter to check for an exact number of subelements
         Returns a list of all matching subelements"""
-        subelements = element.findall(subelement_path, namespaces=namespaces)
+        subelements = compile_path(subelement_path)(element)
         exist = True
         if expected and (len(subelements) != expected):
             self.error(
@@ -131,7 +186,7 @@ class MetsValidator(BaroqueValidator):
         mets_date = sanitize_text(mets_date)
         if metadata_date == "Undated" and mets_date == "undated":
             pass
-        if dateparser.parse(metadata_date) != dateparser.parse(mets_date):
+        if normalize_date(metadata_date) != normalize_date(mets_date):
             self.error(
                     self.path_to_mets,
                     self.item_id,
@@ -142,7 +197,8 @@ class MetsValidator(BaroqueValidator):
         """
         Helper function to check if a subelement exists
         Returns a single subelement"""
-        subelement = element.find(subelement_path, namespaces=namespaces)
+        subelements = compile_path(subelement_path)(element)
+        subelement = subelements[0] if subelements else None
         exists = True
         if subelement is None:
             self.error(
@@ -298,7 +354,7 @@ class MetsValidator(BaroqueValidator):
             if exist:
                 found_files = []
                 for techMD in techMDs:
-                    if techMD.find("mets:mdRef", namespaces=namespaces) is None:
+                    if not compile_path("mets:mdRef")(techMD):
                         primary_identifier_element, exists = self.check_subelement_exists(techMD, "./mets:mdWrap/mets:xmlData/aes:audioObject/aes:primaryIdentifier")
                         if exists:
                             found_files.append(primary_identifier_element.text)                    
@@ -347,7 +403,7 @@ class MetsValidator(BaroqueValidator):
                     expected_files = self.item_files["wav"] + self.item_files["mp3"]
                     file_pointers = []
                     for sub_div in sub_divs:
-                        fptrs = sub_div.findall("mets:fptr", namespaces=namespaces)
+                        fptrs = compile_path("mets:fptr")(sub_div)
                         for fptr in fptrs:
                             file_id = fptr.attrib.get("FILEID").replace("mdp.", "").strip()
                             file_pointers.append(file_id)
@@ -358,19 +414,47 @@ class MetsValidator(BaroqueValidator):
                             "mets structMap fileptr IDs {} do not match expected {}".format(file_pointers, expected_files)
                         )
 
-    def parse_item_mets(self, item):
+    def index_sections(self):
         """
-        Parses item METS"""
-
+        Indexes the root mets element and its top-level mets sections (e.g., metsHdr, amdSec) by path
+        in a single pass over the root's children, so section validators don't search from the root again.
+
+        {
+            "/mets:mets": [root element],
+            "/mets:mets/mets:metsHdr": [metsHdr element],
+            "/mets:mets/mets:dmdSec": [dmdSec element],
+            ...
+        }"""
+        mets_namespace = "{" + namespaces["mets"] + "}"
+        self.sections = {"/mets:mets": []}
+        root = self.tree.getroot()
+        if root.tag != mets_namespace + "mets":
+            return
+
+        self.sections["/mets:mets"].append(root)
+        for child in root:
+            # Skip comments and processing instructions, whose tags are not strings
+            if isinstance(child.tag, str) and child.tag.startswith(mets_namespace):
+                path = "/mets:mets/mets:" + child.tag[len(mets_namespace):]
+                self.sections.setdefault(path, []).append(child)
+
+    def load_item(self, item, item_metadata):
         path_to_item = item['path']
         mets = item['files']['xml'][0]
 
         self.item_id = item['id']
         self.item_files = item["files"]
-        self.item_metadata = self.project.metadata["item_metadata"].get(self.item_id)
+        self.item_metadata = item_metadata
         self.path_to_mets = os.path.join(path_to_item, mets)
+
+    def parse_item_mets(self, item, item_metadata):
+        """
+        Parses item METS"""
+
+        self.load_item(item, item_metadata)
         try:
             self.tree = etree.parse(self.path_to_mets)
+            self.index_sections()
             return True
         except:
             self.error(
@@ -380,20 +464,158 @@ class MetsValidator(BaroqueValidator):
             )
             return False
 
+    def section_validators(self):
+        """
+        Returns (path, validator) tuples for the root element and each top-level section, in validation order"""
+        return [
+            ("/mets:mets", self.validate_root_element),
+            ("/mets:mets/mets:metsHdr", self.validate_mets_header),
+            ("/mets:mets/mets:dmdSec", self.validate_descriptive_metadata),
+            ("/mets:mets/mets:amdSec", self.validate_administrative_metadata),
+            ("/mets:mets/mets:fileSec", self.validate_file_section),
+            ("/mets:mets/mets:structMap", self.validate_structural_map_section),
+        ]
+
+    def stream_item_mets(self):
+        """
+        Validates item METS with etree.iterparse instead of parsing the whole file.
+
+        The root element is validated when it opens. Each top-level section is validated as soon as it closes
+        and is then cleared, and amdSec content that is not validated is discarded as it is parsed,
+        so memory use stays bounded however large the METS file is.
+        Each section's errors are held until the end of the file, so that missing or repeated sections
+        and invalid XML are reported exactly as they are when the whole file is parsed."""
+
+        mets_namespace = "{" + namespaces["mets"] + "}"
+        section_validators = self.section_validators()
+        validators = dict(section_validators)
+        section_errors = {}
+        buffer = self.buffer
+        self.sections = {"/mets:mets": []}
+
+        def validate_section(path):
+            self.buffer = section_errors[path] = []
+            validators[path]()
+
+        try:
+            depth = -1
+            is_mets = False
+            in_amdsec = False
+            for event, element in etree.iterparse(self.path_to_mets, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 0 and element.tag == mets_namespace + "mets":
+                        is_mets = True
+                        self.sections["/mets:mets"].append(element)
+                        validate_section("/mets:mets")
+                    elif depth == 1:
+                        in_amdsec = element.tag == mets_namespace + "amdSec"
+                    continue
+
+                if depth == 1:
+                    if is_mets and isinstance(element.tag, str) and element.tag.startswith(mets_namespace):
+                        path = "/mets:mets/mets:" + element.tag[len(mets_namespace):]
+                        self.sections.setdefault(path, []).append(element)
+                        if path in validators and len(self.sections[path]) == 1:
+                            validate_section(path)
+                    # Clear the section and drop it and any preceding siblings from the root
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+                    in_amdsec = False
+                elif depth >= 3 and in_amdsec and element.tag not in STREAMING_AMDSEC_KEEP_TAGS:
+                    element.getparent().remove(element)
+                depth -= 1
+        except (etree.XMLSyntaxError, OSError):
+            self.buffer = buffer
+            self.error(
+                self.path_to_mets,
+                self.item_id,
+                "mets xml is not valid"
+            )
+            return
+        finally:
+            self.buffer = buffer
+
+        for path, validator in section_validators:
+            if len(self.sections.get(path, [])) == 1:
+                for error in section_errors[path]:
+                    self.add_error(*error)
+            else:
+                # Report the missing or repeated section
+                validator()
+
+    def validate_item_mets(self, item, item_metadata):
+        """
+        Validates a single item's METS
+        Only uses the item and its metadata export values, so it can run in a separate process"""
+
+        if self.streaming:
+            self.load_item(item, item_metadata)
+            self.stream_item_mets()
+        elif self.parse_item_mets(item, item_metadata):
+            for _, validator in self.section_validators():
+                validator()
+
     def validate_mets(self):
         """
-        Validates METS"""
+        Validates METS
 
-        for item in tqdm(self.project.items, desc="METS Validation"):
+        With more than one process, each item's METS is validated as a separate task on a process pool.
+        Each task returns its errors, which are added to the project in item order.
+        Items whose results are in the project's validation cache are not parsed again; their cached errors are added instead."""
 
+        tasks = []
+        for item in self.project.items:
             # Assuming for now that validating directory and file structure would have picked this up
             if not item['files']['xml']:
                 continue
-            else:
-                if self.parse_item_mets(item):
-                    self.validate_root_element()
-                    self.validate_mets_header()
-                    self.validate_descriptive_metadata()
-                    self.validate_administrative_metadata()
-                    self.validate_file_section()
-                    self.validate_structural_map_section()
+            tasks.append((item, self.project.metadata["item_metadata"].get(item['id'])))
+
+        cache = self.project.cache
+        cached_errors = {}
+        if cache:
+            for item, item_metadata in tasks:
+                errors = cache.get(self.validation, self.get_mets_entry(item), self.cache_version, cache.make_context(item, item_metadata))
+                if errors is not None:
+                    cached_errors[item['id']] = errors
+        pending_tasks = [task for task in tasks if task[0]['id'] not in cached_errors]
+
+        if self.processes != 1:
+            processes = self.processes or os.cpu_count()
+            # Only send the validator's settings to each process, not the project
+            worker = self.buffered()
+            worker.project = None
+            worker.validator = None
+            chunksize = max(1, len(pending_tasks) // (processes * 8))
+            executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(worker,))
+            buffers = executor.map(_validate_item_mets_task, pending_tasks, chunksize=chunksize)
+        else:
+            executor = None
+            buffers = map(self.validate_item_mets_task, pending_tasks)
+
+        try:
+            for item, item_metadata in tqdm(tasks, desc="METS Validation"):
+                if item['id'] in cached_errors:
+                    errors = cached_errors[item['id']]
+                else:
+                    errors = next(buffers)
+                    if cache:
+                        cache.put(self.validation, self.get_mets_entry(item), self.cache_version, cache.make_context(item, item_metadata), errors)
+                self.flush(errors)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def validate_item_mets_task(self, task):
+        """
+        Validates one item's METS in a buffered copy of the validator and returns the item's errors"""
+        item, item_metadata = task
+        worker = self.buffered()
+        worker.validate_item_mets(item, item_metadata)
+        return worker.buffer
+
+    def get_mets_entry(self, item):
+        """
+        Returns the inventory entry of an item's METS file"""
+        return self.project.entries[os.path.join(item['path'], item['files']['xml'][0])]
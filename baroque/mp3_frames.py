@@ -0,0 +1,239 @@
+import mmap
+import os
+import struct
+
+
+# Bitrates in kbps by MPEG version and layer, indexed by the header's bitrate index (0 is free format, 15 is invalid)
+# http://www.mp3-tech.org/programmer/frame_header.html
+MPEG1_BITRATES = {
+    1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+}
+MPEG2_BITRATES = {
+    1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+# Sample rates by MPEG version, indexed by the header's sample rate index (3 is reserved)
+SAMPLE_RATES = {
+    "1": [44100, 48000, 32000],
+    "2": [22050, 24000, 16000],
+    "2.5": [11025, 12000, 8000]
+}
+# MPEG version and layer bits of a frame header
+MPEG_VERSIONS = {0: "2.5", 2: "2", 3: "1"}
+MPEG_LAYERS = {1: 3, 2: 2, 3: 1}
+ID3V2_HEADER = struct.Struct(">3sBBB4s")
+ID3V1_SIZE = 128
+# Preamble, version, tag size, item count, flags and 8 reserved bytes
+APE_FOOTER = struct.Struct("<8sIIII8x")
+
+
+class Mp3FrameError(Exception):
+    pass
+
+
+def parse_frame_header(header):
+    """
+    Parses a 32-bit MPEG audio frame header
+    Returns a dictionary with the frame's MPEG version, layer, bitrate (kbps), sample rate, channels,
+    samples per frame and length in bytes, or None if the header is not a valid frame header"""
+    if header >> 21 != 0x7FF:
+        return None
+    version = MPEG_VERSIONS.get((header >> 19) & 3)
+    layer = MPEG_LAYERS.get((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 3
+    # Free format frames have no fixed length, so they cannot be walked
+    if version is None or layer is None or bitrate_index in [0, 15] or sample_rate_index == 3:
+        return None
+
+    bitrates = MPEG1_BITRATES if version == "1" else MPEG2_BITRATES
+    bitrate = bitrates[layer][bitrate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header >> 9) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == "1" else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if (header >> 6) & 3 == 3 else 2,
+        "samples": samples,
+        "length": length
+    }
+
+
+def get_id3v2_size(data):
+    """
+    Returns the size of the ID3v2 tag at the start of data, including its header and footer, or 0 if there is none"""
+    if len(data) < ID3V2_HEADER.size or data[:3] != b"ID3":
+        return 0
+    _, _, _, flags, size = ID3V2_HEADER.unpack_from(data)
+    # The tag size is "syncsafe": 7 bits in each of 4 bytes
+    size = (size[0] << 21) | (size[1] << 14) | (size[2] << 7) | size[3]
+    footer = 10 if flags & 0x10 else 0
+    return ID3V2_HEADER.size + size + footer
+
+
+def get_audio_end(data):
+    """
+    Returns the offset of the end of the audio frames, before any ID3v1 or APEv2 tag at the end of data"""
+    end = len(data)
+    if end >= ID3V1_SIZE and data[end - ID3V1_SIZE:end - ID3V1_SIZE + 3] == b"TAG":
+        end -= ID3V1_SIZE
+    if end >= APE_FOOTER.size and data[end - APE_FOOTER.size:end - APE_FOOTER.size + 8] == b"APETAGEX":
+        _, _, size, _, _ = APE_FOOTER.unpack_from(data, end - APE_FOOTER.size)
+        # The APE tag size includes the footer but not the optional header
+        end -= size + (APE_FOOTER.size if data[end - size - APE_FOOTER.size:end - size - APE_FOOTER.size + 8] == b"APETAGEX" else 0)
+    return max(end, 0)
+
+
+def parse_vbr_header(data, offset, frame):
+    """
+    Reads the Xing/Info or VBRI header in the first frame at offset, which encoders write to record the number of
+    frames in the file
+    Returns whether there is such a header, and the number of audio frames recorded in it (or None)"""
+    # The Xing header follows the side information, whose size depends on the MPEG version and channels
+    if frame["version"] == "1":
+        side_information = 32 if frame["channels"] == 2 else 17
+    else:
+        side_information = 17 if frame["channels"] == 2 else 9
+    xing_offset = offset + 4 + side_information
+    if data[xing_offset:xing_offset + 4] in [b"Xing", b"Info"] and xing_offset + 12 <= len(data):
+        flags = struct.unpack_from(">I", data, xing_offset + 4)[0]
+        if flags & 1:
+            return True, struct.unpack_from(">I", data, xing_offset + 8)[0]
+        return True, None
+    vbri_offset = offset + 4 + 32
+    if data[vbri_offset:vbri_offset + 4] == b"VBRI" and vbri_offset + 18 <= len(data):
+        return True, struct.unpack_from(">I", data, vbri_offset + 14)[0]
+    return False, None
+
+
+def find_frame(data, offset, end):
+    """
+    Returns the offset of the next valid frame header at or after offset, or None if there is none before end
+    A sync is only accepted if it is followed by another valid frame header, or reaches end"""
+    while True:
+        offset = data.find(b"\xff", offset, end - 3)
+        if offset == -1:
+            return None
+        frame = parse_frame_header(int.from_bytes(data[offset:offset + 4], "big"))
+        if frame is not None:
+            next_offset = offset + frame["length"]
+            if next_offset >= end or (next_offset + 4 <= end and parse_frame_header(int.from_bytes(data[next_offset:next_offset + 4], "big"))):
+                return offset
+        offset += 1
+
+
+def scan_mp3_frames(data):
+    """
+    Walks the frame headers of MP3 data (e.g., a memory-mapped file) without decoding audio
+
+    Returns a dictionary, e.g.:
+    {
+        "audio_offset": 4096,
+        "version": "1",
+        "layer": 3,
+        "sample_rate": 44100,
+        "channels": 2,
+        "frames": 137812,
+        "duration": 3600.02,
+        "bitrate": 128.0,
+        "vbr": False,
+        "vbr_header_frames": 137812,
+        "sync_errors": [],
+        "truncated": False
+    }
+
+    frames does not count the frame holding a Xing/Info or VBRI header, and bitrate is the average in kbps.
+    sync_errors lists an (offset, skipped bytes) tuple for each place where frame sync was lost and found again.
+    Raises Mp3FrameError if there are no MPEG audio frames."""
+    audio_offset = get_id3v2_size(data)
+    end = get_audio_end(data)
+    first_offset = find_frame(data, audio_offset, end)
+    if first_offset is None:
+        raise Mp3FrameError("no MPEG audio frames found")
+
+    header = int.from_bytes(data[first_offset:first_offset + 4], "big")
+    first_frame = parse_frame_header(header)
+    has_vbr_header, vbr_header_frames = parse_vbr_header(data, first_offset, first_frame)
+    sync_errors = []
+    if first_offset != audio_offset:
+        sync_errors.append((audio_offset, first_offset - audio_offset))
+
+    # Frames in a file share a few distinct headers, so each header is parsed once
+    frames_by_header = {}
+    bitrates = set()
+    frames = 0
+    samples = 0
+    audio_bytes = 0
+    truncated = False
+    offset = first_offset
+    if has_vbr_header:
+        # The first frame holds the Xing/Info or VBRI header rather than audio
+        offset += first_frame["length"]
+    while offset + 4 <= end:
+        header = int.from_bytes(data[offset:offset + 4], "big")
+        frame = frames_by_header.get(header)
+        if frame is None:
+            frame = parse_frame_header(header)
+            # Frames of a different MPEG version, layer or sample rate are not part of the stream
+            if frame is not None and (frame["version"], frame["layer"], frame["sample_rate"]) != \
+                    (first_frame["version"], first_frame["layer"], first_frame["sample_rate"]):
+                frame = None
+            if frame is None:
+                next_offset = find_frame(data, offset + 1, end)
+                if next_offset is None:
+                    sync_errors.append((offset, end - offset))
+                    offset = end
+                    break
+                sync_errors.append((offset, next_offset - offset))
+                offset = next_offset
+                continue
+            frames_by_header[header] = frame
+        if offset + frame["length"] > end:
+            truncated = True
+            break
+        frames += 1
+        samples += frame["samples"]
+        audio_bytes += frame["length"]
+        bitrates.add(frame["bitrate"])
+        offset += frame["length"]
+    if 0 < end - offset < 4:
+        truncated = True
+
+    duration = samples / first_frame["sample_rate"]
+    return {
+        "audio_offset": first_offset,
+        "version": first_frame["version"],
+        "layer": first_frame["layer"],
+        "sample_rate": first_frame["sample_rate"],
+        "channels": first_frame["channels"],
+        "frames": frames,
+        "duration": duration,
+        "bitrate": audio_bytes * 8 / duration / 1000 if duration else 0,
+        "vbr": len(bitrates) > 1,
+        "vbr_header_frames": vbr_header_frames,
+        "sync_errors": sync_errors,
+        "truncated": truncated
+    }
+
+
+def read_mp3_frames(path_to_mp3):
+    """
+    Memory-maps an MP3 file and walks its frame headers with scan_mp3_frames
+    Only the 4-byte header of each frame is examined, and the audio data is never copied"""
+    with open(path_to_mp3, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            raise Mp3FrameError("file is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_mp3_frames(data)
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+from .baroque_validator import BaroqueValidator
+from .mp3_frames import Mp3FrameError, read_mp3_frames
+
+
+# Places where frame sync was lost that are reported per file; further places are counted in one more error
+MAX_REPORTED_SYNC_ERRORS = 10
+
+
+class Mp3Validator(BaroqueValidator):
+    def __init__(self, project, workers=1):
+        validation = "mp3"
+        validator = self.validate_mp3s
+        super().__init__(validation, validator, project)
+        self.workers = workers
+
+    def check_sync(self, path_to_mp3, item_id, sync_errors):
+        """
+        Checks that every byte between the first and last frames belongs to a frame"""
+        for offset, skipped in sync_errors[:MAX_REPORTED_SYNC_ERRORS]:
+            self.error(path_to_mp3, item_id, "mp3 frame sync lost at byte {}; skipped {} bytes".format(offset, skipped))
+        if len(sync_errors) > MAX_REPORTED_SYNC_ERRORS:
+            self.error(path_to_mp3, item_id, "mp3 frame sync lost {} more time(s)".format(len(sync_errors) - MAX_REPORTED_SYNC_ERRORS))
+
+    def validate_mp3(self, path_to_mp3, item_id):
+        """
+        Validates one MP3 file's frame headers"""
+        try:
+            mp3 = read_mp3_frames(path_to_mp3)
+        except (OSError, ValueError, Mp3FrameError) as e:
+            self.error(path_to_mp3, item_id, "mp3 file could not be read: {}".format(e))
+            return
+
+        if mp3["layer"] != 3:
+            self.error(path_to_mp3, item_id, "mp3 file is MPEG-{} Layer {} audio, not Layer III".format(mp3["version"], "I" * mp3["layer"]))
+        self.check_sync(path_to_mp3, item_id, mp3["sync_errors"])
+        if mp3["truncated"]:
+            self.error(path_to_mp3, item_id, "mp3 file is truncated: last frame is incomplete")
+        if mp3["vbr_header_frames"] is not None and mp3["vbr_header_frames"] != mp3["frames"]:
+            self.error(
+                path_to_mp3,
+                item_id,
+                "Xing/VBRI header frame count {} does not match {} frames in mp3 file".format(mp3["vbr_header_frames"], mp3["frames"])
+            )
+
+    def validate_mp3_task(self, task):
+        """
+        Validates an MP3 file with a buffered copy of the validator and returns its errors"""
+        path_to_mp3, item_id = task
+        worker = self.buffered()
+        worker.validate_mp3(path_to_mp3, item_id)
+        return worker.buffer
+
+    def validate_mp3s(self):
+        """
+        Validates the frame headers of every MP3 file
+
+        Each MP3 file is memory-mapped and its frame headers are walked from frame to frame, without decoding audio.
+        With more than one worker, MP3 files are read by a thread pool.
+        Each MP3 file's errors are collected in its own buffer and added to the project in path order."""
+        tasks = []
+        for item in self.project.items:
+            for path_to_mp3 in self.project.get_item_file_paths(item, "mp3"):
+                tasks.append((path_to_mp3, item["id"]))
+        tasks.sort(key=lambda task: task[0])
+
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            if self.workers > 1:
+                buffers = executor.map(self.validate_mp3_task, tasks)
+            else:
+                buffers = map(self.validate_mp3_task, tasks)
+
+            for buffer in tqdm(buffers, total=len(tasks), desc="MP3 Validation"):
+                self.flush(buffer)
@@ -1,31 +1,169 @@
 import csv
 import os
+import re
+import sqlite3
+import time
 
 from datetime import datetime
 
 
+REPORT_FIELDNAMES = ['validation', 'error_type', 'path', 'id', 'error']
+# Number of rows buffered before they are written to the error report, in a single transaction for SQLite reports
+REPORT_FLUSH_ROWS = 500
+# Maximum number of seconds rows are buffered before they are written to the error report
+REPORT_FLUSH_SECONDS = 5
+
+
+# Item IDs (e.g., 85429-SR-7) at the start of error IDs, which may also be part or file IDs (e.g., 85429-SR-7-1-am.wav)
+ITEM_ID_REGEX = re.compile(r"\d+-SR-\d+")
+
+
+class ReportWriter:
+    """
+    Writes errors to an error report as they are found.
+
+    The report is created when the writer is created, at the start of a run, and rows are written in batches
+    so that a run that crashes or is interrupted keeps the errors found so far. The report is removed when the
+    writer is closed if no errors were written.
+
+    Subclasses write a particular report format by implementing open_report, write_rows and close_report.
+    """
+    extension = None
+
+    def __init__(self, source_directory, destination_directory):
+        # Create the report file name with the following structure: directory-YYYYMMDD-HHMMSS.extension.
+        date = datetime.now().strftime("%Y%m%d-%H%M%S")
+        source = os.path.basename(source_directory)
+        report_filename = source + "-" + date + "." + self.extension
+        self.path = os.path.join(destination_directory, report_filename)
+
+        self.open_report()
+        self.buffer = []
+        self.rows = 0
+        self.closed = False
+        self.last_flush = time.monotonic()
+
+    def write(self, error):
+        self.buffer.append(error)
+        self.rows += 1
+        if len(self.buffer) >= REPORT_FLUSH_ROWS or time.monotonic() - self.last_flush >= REPORT_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered rows to disk"""
+        self.write_rows(self.buffer)
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.close_report()
+        self.closed = True
+        if self.rows == 0:
+            os.remove(self.path)
+
+
+class CsvReportWriter(ReportWriter):
+    extension = "csv"
+
+    def open_report(self):
+        self.file = open(self.path, 'w', newline='', encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        # Define and write header row values of csv file.
+        self.writer.writerow(REPORT_FIELDNAMES)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close_report(self):
+        self.file.close()
+
+
+class SqliteReportWriter(ReportWriter):
+    """
+    Writes errors to an indexed "errors" table in an SQLite database, along with the collection and item IDs
+    parsed from each error's ID, so that large reports can be filtered and aggregated with SQL queries.
+    The collection_summary and item_summary views count requirement and warning errors per collection and per item.
+    """
+    extension = "sqlite"
+
+    def open_report(self):
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript("""
+            CREATE TABLE errors (
+                validation TEXT, error_type TEXT, path TEXT, id TEXT, error TEXT, collection_id TEXT, item_id TEXT
+            );
+            CREATE INDEX errors_validation ON errors (validation, error_type);
+            CREATE INDEX errors_error_type ON errors (error_type);
+            CREATE INDEX errors_id ON errors (id);
+            CREATE INDEX errors_path ON errors (path);
+            CREATE INDEX errors_collection_id ON errors (collection_id, item_id);
+            CREATE INDEX errors_item_id ON errors (item_id);
+            CREATE VIEW collection_summary AS
+                SELECT collection_id,
+                    SUM(error_type = 'requirement') AS requirements,
+                    SUM(error_type = 'warning') AS warnings
+                FROM errors GROUP BY collection_id;
+            CREATE VIEW item_summary AS
+                SELECT collection_id, item_id,
+                    SUM(error_type = 'requirement') AS requirements,
+                    SUM(error_type = 'warning') AS warnings
+                FROM errors WHERE item_id IS NOT NULL GROUP BY collection_id, item_id;
+        """)
+
+    def parse_ids(self, id):
+        """
+        Helper function to parse the collection and item IDs from an error's ID
+        Collection IDs are parsed from item IDs (e.g., 85429 from 85429-SR-7); IDs without an item ID are collection IDs if they are numeric"""
+        id = str(id)
+        item_match = ITEM_ID_REGEX.match(id)
+        if item_match:
+            item_id = item_match.group()
+            return item_id.split("-")[0], item_id
+        elif id.isdigit():
+            return id, None
+        else:
+            return None, None
+
+    def write_rows(self, rows):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO errors VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [tuple(row) + self.parse_ids(row[3]) for row in rows]
+            )
+
+    def close_report(self):
+        self.connection.close()
+
+
+REPORT_WRITERS = {
+    "csv": CsvReportWriter,
+    "sqlite": SqliteReportWriter
+}
+
+
 def generate_reports(baroqueproject):
-    data = []
+    errors = baroqueproject.errors
     # Print out the number of errors and warnings for each validation.
-    for validation, errors in baroqueproject.errors.items():
-        num_requirements = len([error for error in errors if error["error_type"] == "requirement"])
-        num_warnings = len([error for error in errors if error["error_type"] == "warning"])
+    for validation in errors.validations:
+        num_requirements = errors.count(validation, "requirement")
+        num_warnings = errors.count(validation, "warning")
         print("SYSTEM REPORT: {} validation has {} requirement error(s) and {} warning error(s)".format(validation, num_requirements, num_warnings))
-        if (num_requirements + num_warnings) > 0:
-            data.extend(errors)
 
-    if data:
-        # Create the csv file name with the following structure: directory-YYYYMMDD-HHMMSS.csv.
-        date = datetime.now().strftime("%Y%m%d-%H%M%S")
-        source = os.path.basename(baroqueproject.source_directory)
-        csv_filename = source + "-" + date + ".csv"
-        csv_filepath = os.path.join(baroqueproject.destination_directory, csv_filename)
-
-        with open(csv_filepath, 'w', newline='', encoding="utf-8") as csvfile:
-            # Define and write header row values of csv file.
-            fieldnames = ['validation', 'error_type', 'path', 'id', 'error']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-        
-        print("SYSTEM ACTIVITY: Detailed error report generated at {}".format(csv_filepath))
+    checksum_cache = baroqueproject.checksum_cache
+    if checksum_cache and (checksum_cache.hits + checksum_cache.misses) > 0:
+        print("SYSTEM REPORT: reused {} cached checksum(s) and computed {} checksum(s)".format(checksum_cache.hits, checksum_cache.misses))
+
+    # Errors are usually written as they are found; otherwise, write the stored errors now.
+    if errors.sink is None and len(errors) > 0:
+        errors.attach(CsvReportWriter(baroqueproject.source_directory, baroqueproject.destination_directory))
+
+    if errors.sink is not None:
+        errors.sink.close()
+        if errors.sink.rows > 0:
+            print("SYSTEM ACTIVITY: Detailed error report generated at {}".format(errors.sink.path))
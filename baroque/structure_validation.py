@@ -1,5 +1,4 @@
 import os
-import re
 import sys
 from tqdm import tqdm
 
@@ -8,8 +7,8 @@ from .baroque_validator import BaroqueValidator
 
 # structure_validation.py runs "validate_structure", which calls for "validate_directory" and "validate_file"
 # "validate_directory" uses "parse_baroqueproject", "parse_metadata_export", "compare_ids", and "check_empty_directory"
-# "validate_file" uses "check_item_files" and "check_intellectual_groups"
-# "check_item_files" uses "check_empty_file" and "check_intellectual_groups" uses "create_intellectual_groups"
+# "validate_file" uses "check_item_files", "create_intellectual_groups" and "check_intellectual_groups"
+# "check_item_files" uses "check_empty_file" and "check_intellectual_groups" uses the groups made by "create_intellectual_groups"
 
 class StructureValidator(BaroqueValidator):
     def __init__(self, project):
@@ -28,17 +27,14 @@ class StructureValidator(BaroqueValidator):
         return ids, paths
 
     def check_empty_directory(self, directory_path):
-        if len(os.listdir(directory_path)) == 0:
+        if len(self.project.scan_directory(directory_path)) == 0:
             self.error(directory_path, os.path.basename(directory_path), "empty directory")
 
     def check_empty_file(self, file_path):
-        for dirpath, dirnames, filenames in os.walk(file_path):
-            for filename in filenames:
-                if ".txt" not in filename:
-                    file_path = os.path.join(dirpath, filename)
-                    file_size = os.path.getsize(file_path)
-                    if file_size == 0:
-                        self.error(file_path, os.path.basename(file_path), "empty file")
+        for entry in self.project.walk_files(file_path):
+            if ".txt" not in entry.name:
+                if entry.size == 0:
+                    self.error(entry.path, entry.name, "empty file")
 
     def validate_directory(self, level):
         """
@@ -50,6 +46,7 @@ class StructureValidator(BaroqueValidator):
         """
         process_ids, process_paths = self.parse_baroqueproject(level)
         export_ids = self.project.metadata["{}_ids".format(level)]
+        process_index = getattr(self.project, "{}_by_id".format(level))
 
         diff_process_ids = list(set(process_ids) - set(export_ids))
         diff_export_ids = list(set(export_ids) - set(process_ids))
@@ -57,11 +54,8 @@ class StructureValidator(BaroqueValidator):
         # Report ids that do not exist in the metadata export as errors.
         if len(diff_process_ids) != 0:
             for id in diff_process_ids:
-                for tuple_id, tuple_path in tuple(zip(process_ids, process_paths)):
-                    if id == tuple_id:
-                        path = tuple_path
                 self.error(
-                    path,
+                    process_index[id]["path"],
                     id,
                     level[:-1] + " id does not exist in metadata export"
                 )
@@ -185,40 +179,15 @@ class StructureValidator(BaroqueValidator):
                 }
             }
         """
-        part_file_types = ["md5", "mp3", "wav"]
-        part_name_regex = re.compile(r"\d+\-SR-\d+(\-\d+){1,}")
-        items = {}
+        return self.project.get_digital_parts()
 
-        for item in self.project.items:
-            for file_type, files in item["files"].items():
-                if file_type in part_file_types:
-                    for file in files:
-
-                        # Isolate file names without extensions (e.g., "-am.wav").
-                        name_match = part_name_regex.match(file)
-                        if name_match:
-                            name = name_match.group()
-
-                            # Create dictionary of intellectual groups
-                            if item["id"] not in items.keys():
-                                items[item["id"]] = {}
-                            if name not in items[item["id"]].keys():
-                                items[item["id"]][name] = []
-                            items[item["id"]][name].append(file)
-
-        return items
-
-    def check_intellectual_groups_numbers(self):
+    def check_intellectual_groups_numbers(self, items):
             """
             Make sure that intellectual groups are well-formed by checking that each part number is consecutively numbered.
             """
-            items = self.create_intellectual_groups()
-
             for item in items.keys():
                 # Find each item's path, which is needed for error reporting.
-                for item_dict in self.project.items:
-                    if item_dict["id"] == item:
-                        path = item_dict["path"]
+                path = self.project.items_by_id[item]["path"]
 
                 # Check that each of the part numbers is consecutive
                 part_ids = []
@@ -242,20 +211,16 @@ class StructureValidator(BaroqueValidator):
                          "item has digital parts that are not consecutively numbered: {}".format(part_ids)
                     )
 
-    def check_intellectual_groups_files(self):
+    def check_intellectual_groups_files(self, items):
         """
         Make sure that intellectual groups are well-formed by:
         (1) Checking that each part only has 6 files.
         (2) Checking that each part has exactly one of the 6 required file formats.
         Report any exceptions (e.g., more than 6 files, missing required files) as errors.
         """
-        items = self.create_intellectual_groups()
-
         for item in items.keys():
             # Find each item's path, which is needed for error reporting.
-            for item_dict in self.project.items:
-                if item_dict["id"] == item:
-                    path = item_dict["path"]
+            path = self.project.items_by_id[item]["path"]
 
             for part in items[item]:
                 count_formats = {"-am.wav": 0, "-am.wav.md5": 0, "-pm.wav": 0, "-pm.wav.md5": 0, ".mp3": 0, ".mp3.md5": 0, "other":[]}
@@ -341,8 +306,10 @@ class StructureValidator(BaroqueValidator):
 
     def validate_file(self):
         self.check_item_files()
-        self.check_intellectual_groups_numbers()
-        self.check_intellectual_groups_files()
+        # Group files into digital parts once, for both intellectual group checks.
+        items = self.create_intellectual_groups()
+        self.check_intellectual_groups_numbers(items)
+        self.check_intellectual_groups_files(items)
 
     def validate_structure(self):
         """
@@ -1,26 +1,60 @@
+import functools
+import os
 import unicodedata
 
 
+class SanitizeTable(dict):
+    """
+    Translation table for sanitize_text, filled in as new characters are seen
+    Maps each character to the text it is replaced with, or None to remove it"""
+
+    def __missing__(self, codepoint):
+        character = chr(codepoint)
+        if character == "&":
+            replacement = "and"
+        # Remove non-alphanumeric characters BUT keeps single spaces and "/" (for date format)
+        # https://stackoverflow.com/questions/7406102/create-sane-safe-filename-from-any-unsafe-string
+        elif character.isalnum() or character in (" ", "/"):
+            # Normalize unicode accents. Only combining marks are reordered by NFD, and they are removed by the ASCII
+            # encoding, so normalizing each character gives the same result as normalizing the whole string.
+            # https://stackoverflow.com/questions/44431730/how-to-replace-accented-characters-in-python?rq=1
+            # https://docs.python.org/3.8/library/unicodedata.html#unicodedata.normalize
+            replacement = unicodedata.normalize('NFD', character).encode('ascii', 'ignore').decode() or None
+        else:
+            replacement = None
+        self[codepoint] = replacement
+        return replacement
+
+
+SANITIZE_TABLE = SanitizeTable()
+
+
+@functools.lru_cache(maxsize=4096)
 def sanitize_text(string):
     """
     Helper function to remove newlines and extra spaces from a string"""
     if string is None:
         return ""
     else:
-        string = string.replace("&", "and")
-
         # Replace "runs of consecutive whitespace" to single spaces AND remove trailing spaces
         # https://docs.python.org/3.8/library/stdtypes.html#str.split
-        string = " ".join(string.split()).strip()
+        string = " ".join(string.split())
 
-        # Remove non-alphanumeric characters BUT keeps single spaces and "/" (for date format)
-        # https://stackoverflow.com/questions/7406102/create-sane-safe-filename-from-any-unsafe-string
-        keep_characters = (" ", "/")
-        string = "".join(c for c in string if c.isalnum() or c in keep_characters)
+        # Replace "&" with "and", remove non-alphanumeric characters and normalize unicode accents
+        return string.translate(SANITIZE_TABLE)
 
-        # Normalize unicode accents
-        # https://stackoverflow.com/questions/44431730/how-to-replace-accented-characters-in-python?rq=1
-        # https://docs.python.org/3.8/library/unicodedata.html#unicodedata.normalize
-        string = unicodedata.normalize('NFD', string).encode('ascii', 'ignore').decode()
 
-        return string
+def format_time(seconds):
+    """
+    Helper function to format a position in seconds as HH:MM:SS.s"""
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return "{:02d}:{:02d}:{:04.1f}".format(hours, minutes, seconds)
+
+
+def is_path_under(path, directory):
+    """
+    Helper function to check whether a path is a directory or anything inside it, without touching the filesystem"""
+    path = os.path.normcase(os.path.abspath(path))
+    directory = os.path.normcase(os.path.abspath(directory))
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
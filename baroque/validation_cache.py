@@ -0,0 +1,202 @@
+import datetime
+import json
+import os
+import sqlite3
+
+from .utils import is_path_under
+
+
+CACHE_FILENAME = "baroque-cache.db"
+# Number of new results stored between commits, so that an interrupted run keeps most of its results
+COMMIT_INTERVAL = 500
+# strptime formats of the ISO strings that dates and times in metadata export values are stored as, with and without microseconds
+EXPORT_DATE_FORMATS = {
+    "datetime": ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"),
+    "date": ("%Y-%m-%d",),
+    "time": ("%H:%M:%S.%f", "%H:%M:%S")
+}
+
+
+def encode_export_value(value):
+    """
+    Returns a JSON-serializable form of a metadata export value that json cannot serialize itself (e.g., a date from an xlsx export)
+    Dates and times are stored as ISO strings, e.g. {"date": "1975-04-12"}"""
+    if isinstance(value, (datetime.datetime, datetime.time)) and value.tzinfo is not None:
+        raise TypeError("cannot store timezone-aware {!r} in export index".format(value))
+    # datetime.datetime is a subclass of datetime.date, so it is checked first
+    for name, value_type in [("datetime", datetime.datetime), ("date", datetime.date), ("time", datetime.time)]:
+        if isinstance(value, value_type):
+            return {name: value.isoformat()}
+    raise TypeError("cannot store {!r} in export index".format(value))
+
+
+def decode_export_value(value):
+    """
+    Converts a date or time stored by encode_export_value back to a datetime object"""
+    if len(value) == 1:
+        name, string = next(iter(value.items()))
+        if name in EXPORT_DATE_FORMATS:
+            date_format = EXPORT_DATE_FORMATS[name][0 if "." in string else -1]
+            parsed = datetime.datetime.strptime(string, date_format)
+            if name == "date":
+                return parsed.date()
+            elif name == "time":
+                return parsed.time()
+            return parsed
+    return value
+
+
+class ValidationCache:
+    """
+    Stores the errors found for each validated file in an SQLite database in the destination directory,
+    so that re-running BAroQUe on a re-delivered shipment only revalidates files that have changed.
+
+    Results are stored per validation and path, along with:
+    - the file's size and mtime, taken from the BaroqueProject inventory
+    - the validator's cache version, which is increased whenever a validator's checks change
+    - a context string describing everything else the result depends on (e.g., metadata export values)
+    A cached result is only reused when all of these match.
+
+    It also stores an index of each metadata export's parsed values, keyed by the export's path, a hash of its
+    contents and the column names used, so that an unchanged export does not have to be parsed again.
+    The values are stored per collection as JSON, so collection-level and item-level runs only load the rows they need.
+    The destination directory may be shared, so nothing read from the cache is ever unpickled or evaluated.
+    """
+
+    def __init__(self, destination_directory):
+        self.path = os.path.join(destination_directory, CACHE_FILENAME)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "validation TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, version TEXT, context TEXT, errors TEXT, "
+            "PRIMARY KEY (validation, path))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS export_indexes ("
+            "path TEXT PRIMARY KEY, content_hash TEXT, column_mapping TEXT)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS export_collections ("
+            "path TEXT, collection_id TEXT, export_values TEXT, "
+            "PRIMARY KEY (path, collection_id))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.uncommitted = 0
+
+    def make_context(self, *values):
+        """
+        Returns a stable string describing the values a validation result depends on"""
+        return json.dumps(values, sort_keys=True, default=str)
+
+    def get(self, validation, entry, version, context):
+        """
+        Returns the cached errors for an inventory entry, or None if there is no up-to-date result"""
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, version, context, errors FROM results WHERE validation = ? AND path = ?",
+            (validation, entry.path)
+        ).fetchone()
+        if row is None or tuple(row[:4]) != (entry.size, entry.mtime_ns, str(version), context):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return [tuple(error) for error in json.loads(row[4])]
+
+    def put(self, validation, entry, version, context, errors):
+        """
+        Stores the errors found for an inventory entry"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (validation, entry.path, entry.size, entry.mtime_ns, str(version), context, json.dumps(errors))
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def get_export_index(self, path, content_hash, column_mapping, collections_ids=None):
+        """
+        Returns the stored values of a metadata export's rows, in export order, or None if the export or the column names have changed
+        Only rows of the given collections are loaded, unless collections_ids is None"""
+        row = self.connection.execute(
+            "SELECT content_hash, column_mapping FROM export_indexes WHERE path = ?",
+            (os.path.abspath(path),)
+        ).fetchone()
+        if row is None or tuple(row) != (content_hash, json.dumps(column_mapping)):
+            return None
+
+        if collections_ids is None:
+            blobs = self.connection.execute(
+                "SELECT export_values FROM export_collections WHERE path = ?",
+                (os.path.abspath(path),)
+            )
+        else:
+            collections_ids = list(collections_ids)
+            blobs = self.connection.execute(
+                "SELECT export_values FROM export_collections WHERE path = ? AND collection_id IN ({})".format(", ".join("?" * len(collections_ids))),
+                [os.path.abspath(path)] + collections_ids
+            )
+        export_values = []
+        try:
+            for blob in blobs:
+                export_values.extend((position, tuple(values)) for position, values in json.loads(blob[0], object_hook=decode_export_value))
+        except ValueError:
+            # An index that is not valid JSON (e.g., written by an earlier version of BAroQUe) is replaced
+            return None
+        export_values.sort(key=lambda position_values: position_values[0])
+
+        return [values for _, values in export_values]
+
+    def put_export_index(self, path, content_hash, column_mapping, collections_values):
+        """
+        Stores the values of a metadata export's rows, replacing any index of an earlier version of the export
+        collections_values maps each collection ID to a list of (row position, row values) tuples
+        Nothing is stored if a value cannot be stored as JSON"""
+        path = os.path.abspath(path)
+        try:
+            collections_json = [
+                (path, collection_id, json.dumps(values, default=encode_export_value)) for collection_id, values in collections_values.items()
+            ]
+        except TypeError:
+            return
+        self.connection.execute("DELETE FROM export_collections WHERE path = ?", (path,))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO export_indexes VALUES (?, ?, ?)",
+            (path, content_hash, json.dumps(column_mapping))
+        )
+        self.connection.executemany(
+            "INSERT INTO export_collections VALUES (?, ?, ?)",
+            collections_json
+        )
+        self.connection.commit()
+
+    def evict_missing(self, source_directory, known_paths):
+        """
+        Removes results for files under the source directory that no longer exist
+        Only paths under source_directory are considered, and a path is missing if it is not in known_paths
+        (the BaroqueProject inventory). The filesystem is never checked, so results for other shipments (e.g., on
+        a drive or share that is not mounted) are kept, and runs do not stat every file ever cached."""
+        paths = [row[0] for row in self.connection.execute("SELECT DISTINCT path FROM results")]
+        missing = [(path,) for path in paths if path not in known_paths and is_path_under(path, source_directory)]
+        self.connection.executemany("DELETE FROM results WHERE path = ?", missing)
+
+        # Metadata exports are usually kept outside the source directory, so their indexes are only removed when
+        # they are under it, and otherwise replaced when the export changes
+        export_paths = [row[0] for row in self.connection.execute("SELECT path FROM export_indexes")]
+        export_paths = [path for path in export_paths if is_path_under(path, source_directory)]
+        missing_exports = []
+        if export_paths:
+            # Export index paths are absolute, while inventory paths start with the source directory as given
+            known_export_paths = set(os.path.abspath(path) for path in known_paths)
+            missing_exports = [(path,) for path in export_paths if path not in known_export_paths]
+        self.connection.executemany("DELETE FROM export_indexes WHERE path = ?", missing_exports)
+        self.connection.executemany("DELETE FROM export_collections WHERE path = ?", missing_exports)
+
+        self.connection.commit()
+        return len(missing) + len(missing_exports)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -1,36 +1,67 @@
 import csv
-import dateparser
 import os
 import subprocess
 import io
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 from baroque import defaults
 from .baroque_validator import BaroqueValidator
+from .date_normalization import normalize_date
 from .utils import sanitize_text
+from .wav_chunks import parse_coding_history, read_bext_metadata, WavChunkError
+
+# Windows limits a command line to 32,767 characters; leave headroom for the executable path and quoting
+BWFMETAEDIT_MAX_COMMAND_LENGTH = 32000
 
 
 class WavBextChunkValidator(BaroqueValidator):
-    def __init__(self, project):
+    # Increase whenever the checks change, so results cached by earlier versions are not reused
+    cache_version = 1
+
+    def __init__(self, project, use_bwfmetaedit=False, workers=1):
         validation = "wav_bext_chunk"
         validator = self.validate_wav_bext_chunks
         super().__init__(validation, validator, project)
+        self.use_bwfmetaedit = use_bwfmetaedit
+        self.workers = workers
+        # WAV files that could not be read by a buffered copy of the validator
+        self.read_failures = []
 
-    def get_paths_to_wavs(self, item):
+    def load_item(self, item):
         self.item_id = item["id"]
         self.path_to_item = item["path"]
         self.item_metadata = self.project.metadata["item_metadata"].get(self.item_id)
-        paths_to_wavs = []
-        path_to_item = item['path']
-        wav_files = item['files']['wav']
-        for wav_file in wav_files:
-            paths_to_wavs.append(os.path.join(path_to_item, wav_file))
+
+    def get_paths_to_wavs(self, item):
+        self.load_item(item)
+        paths_to_wavs = self.project.get_item_file_paths(item, "wav")
 
         return paths_to_wavs
 
-    def get_bwfmetaedit_csv(self, path_to_wav):
+    def batch_paths_to_wavs(self, paths_to_wavs):
+        """
+        Splits a list of WAV paths into batches that each fit on a single BWF MetaEdit command line"""
+        batches = []
+        batch = []
+        command_length = len(defaults.BWFMETAEDIT) + len(" --out-core")
+        for path_to_wav in paths_to_wavs:
+            # Each path is separated by a space and may be quoted
+            path_length = len(path_to_wav) + 3
+            if batch and command_length + path_length > BWFMETAEDIT_MAX_COMMAND_LENGTH:
+                batches.append(batch)
+                batch = []
+                command_length = len(defaults.BWFMETAEDIT) + len(" --out-core")
+            batch.append(path_to_wav)
+            command_length += path_length
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def get_bwfmetaedit_csv(self, paths_to_wavs):
         """
-        Uses Windows 64-bit BWF MetaEdit CLI to get BEXT CSV
+        Uses Windows 64-bit BWF MetaEdit CLI to get BEXT CSV for a batch of WAV files, with one row per file
 
         Example CSV:
 
@@ -39,7 +70,7 @@ class WavBextChunkValidator(BaroqueValidator):
 A=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D",,,,,,,"Schreibeis, Ryan",,,,,,,,,Reel-to-reel; 7 inch; Sony; None; Polyester"""
 
         bwfmetaedit_path = defaults.BWFMETAEDIT
-        cmd = [bwfmetaedit_path, "--out-core", path_to_wav]
+        cmd = [bwfmetaedit_path, "--out-core"] + paths_to_wavs
         bwfmetaedit_csv = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
 
         return bwfmetaedit_csv
@@ -69,7 +100,7 @@ A=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D",,,,,,,"Schreibeis, Ryan
         """
         Helper function to see if WAV BEXT chunk metadata element value looks like a date or time"""
         self.check_bext_metadatum_exists(path_to_wav, row, metadatum)
-        if row.get(metadatum) and not dateparser.parse(row[metadatum]):
+        if row.get(metadatum) and not normalize_date(row[metadatum]):
             self.error(
                 path_to_wav,
                 self.item_id,
@@ -114,16 +145,7 @@ A=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D",,,,,,,"Schreibeis, Ryan
 
         self.check_bext_metadatum_exists(path_to_wav, row, "CodingHistory")
         if row.get("CodingHistory"):
-            coding_histories = []
-            for coding_history_line in row["CodingHistory"].splitlines():
-                if coding_history_line:
-                    coding_history = {}
-                    subelements = coding_history_line.split(",")
-                    for subelement in subelements:
-                        subelement_tag = subelement.split("=")[0]
-                        subelement_text = subelement.split("=")[1]
-                        coding_history[subelement_tag] = subelement_text
-                    coding_histories.append(coding_history)
+            coding_histories = parse_coding_history(row["CodingHistory"])
 
             acceptable_subelement_tags = [
                     "A", # Coding algorithm
@@ -155,41 +177,156 @@ A=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D",,,,,,,"Schreibeis, Ryan
 
             self.check_num_coding_history_subelement_is_at_least_one(path_to_wav, coding_histories, "T")
 
-    def validate_bwfmetaedit_csv(self, path_to_wav, bwfmetaedit_csv):
+    def validate_bext_metadata(self, path_to_wav, row):
+        """
+        Validates one WAV file's BEXT chunk metadata, supplied as a dictionary keyed by BWF MetaEdit CSV column names"""
+
+        if self.item_metadata and self.item_metadata.get("item_title"):
+            item_title = self.item_metadata.get("item_title")
+            self.check_bext_metadatum_value_is(path_to_wav, row, "Description", item_title)
+        else:
+            self.warn(
+                path_to_wav,
+                self.item_id,
+                "item title not found in metadata export spreadsheet to validate against wav bext chunk"
+            )
+            self.check_bext_metadatum_exists(path_to_wav, row, "Description")
+
+        self.check_bext_metadatum_value_is(path_to_wav, row, "Originator", "US, MiU-H")
+        originator_reference = "MiU-H_" + os.path.splitext(os.path.split(path_to_wav)[1])[0]
+        self.check_bext_metadatum_value_is(path_to_wav, row, "OriginatorReference", originator_reference)
+
+        self.check_bext_metadatum_value_is_datetime(path_to_wav, row, "OriginationDate")
+        self.check_bext_metadatum_value_is_datetime(path_to_wav, row, "OriginationTime")
+
+        self.check_bext_metadatum_exists(path_to_wav, row, "TimeReference")
+
+        self.check_coding_history_subelements(path_to_wav, row)
+
+    def validate_bwfmetaedit_csv(self, batch, bwfmetaedit_csv):
         """
-        Validates BWF Metedit WAV BEXT chunk CSV"""
+        Validates BWF Metedit WAV BEXT chunk CSV for a batch of (path_to_wav, item) tuples
+        Each CSV row is matched back to its WAV file by the FileName column"""
 
+        rows = {}
         with io.StringIO(bwfmetaedit_csv.decode("utf-8")) as f:
             reader = csv.DictReader(f)
             for row in reader:
-                if self.item_metadata and self.item_metadata.get("item_title"):
-                    item_title = self.item_metadata.get("item_title")
-                    self.check_bext_metadatum_value_is(path_to_wav, row, "Description", item_title)
-                else:
-                    self.warn(
-                        path_to_wav,
-                        self.item_id,
-                        "item title not found in metadata export spreadsheet to validate against wav bext chunk"
-                    )
-                    self.check_bext_metadatum_exists(path_to_wav, row, "Description")
-
-                self.check_bext_metadatum_value_is(path_to_wav, row, "Originator", "US, MiU-H")
-                originator_reference = "MiU-H_" + os.path.splitext(os.path.split(path_to_wav)[1])[0]
-                self.check_bext_metadatum_value_is(path_to_wav, row, "OriginatorReference", originator_reference)
+                if row.get("FileName"):
+                    rows[os.path.normcase(os.path.abspath(row["FileName"]))] = row
+
+        for path_to_wav, item in batch:
+            self.load_item(item)
+            row = rows.get(os.path.normcase(os.path.abspath(path_to_wav)))
+            if row is None:
+                self.read_failures.append(path_to_wav)
+                self.error(
+                    path_to_wav,
+                    self.item_id,
+                    "wav file not found in BWF MetaEdit output"
+                )
+            else:
+                self.validate_bext_metadata(path_to_wav, row)
+
+    def validate_wav(self, path_to_wav):
+        """
+        Reads and validates a WAV file's BEXT chunk with the built-in chunk reader"""
 
-                self.check_bext_metadatum_value_is_datetime(path_to_wav, row, "OriginationDate")
-                self.check_bext_metadatum_value_is_datetime(path_to_wav, row, "OriginationTime")
+        try:
+            row = read_bext_metadata(path_to_wav)
+        except (OSError, WavChunkError) as e:
+            if isinstance(e, OSError):
+                self.read_failures.append(path_to_wav)
+            self.error(
+                path_to_wav,
+                self.item_id,
+                "wav file could not be read: {}".format(e)
+            )
+            return
+        self.validate_bext_metadata(path_to_wav, row)
 
-                self.check_bext_metadatum_exists(path_to_wav, row, "TimeReference")
+    def validate_wav_batch(self, batch):
+        """
+        Validates a batch of (path_to_wav, item) tuples
+        BWF MetaEdit is run once per batch; the built-in chunk reader reads each WAV file in turn"""
+
+        if self.use_bwfmetaedit:
+            bwfmetaedit_csv = self.get_bwfmetaedit_csv([path_to_wav for path_to_wav, _ in batch])
+            self.validate_bwfmetaedit_csv(batch, bwfmetaedit_csv)
+        else:
+            for path_to_wav, item in batch:
+                self.load_item(item)
+                self.validate_wav(path_to_wav)
+
+    def validate_wav_batch_task(self, batch):
+        """
+        Validates a batch of WAV files in a buffered copy of the validator
+        Returns the copy's errors and the WAV files it could not read"""
 
-                self.check_coding_history_subelements(path_to_wav, row)
+        worker = self.buffered()
+        worker.read_failures = []
+        worker.validate_wav_batch(batch)
+        return worker.buffer, worker.read_failures
 
     def validate_wav_bext_chunks(self):
         """
-        Validates WAV BEXT chunks """
-
-        for item in tqdm(self.project.items, desc="WAV BEXT Chunk Validation"):
-            paths_to_wavs = self.get_paths_to_wavs(item)
-            for path_to_wav in paths_to_wavs:
-                bwfmetaedit_csv = self.get_bwfmetaedit_csv(path_to_wav)
-                self.validate_bwfmetaedit_csv(path_to_wav, bwfmetaedit_csv)
+        Validates WAV BEXT chunks
+
+        With BWF MetaEdit, WAV files are passed to the tool in batches sized to the command line length limit.
+        With more than one worker, batches are spread across a thread pool.
+        Each batch's errors are collected in its own buffer and added to the project in path order.
+        WAV files whose results are in the project's validation cache are not read again; their cached errors are added instead.
+        Results for WAV files that could not be read are not cached, so the files are read again by the next run."""
+
+        tasks = []
+        for item in self.project.items:
+            for path_to_wav in self.get_paths_to_wavs(item):
+                tasks.append((path_to_wav, item))
+        tasks.sort(key=lambda task: task[0])
+
+        cache = self.project.cache
+        cached_errors = {}
+        if cache:
+            for path_to_wav, item in tasks:
+                errors = cache.get(self.validation, self.project.entries[path_to_wav], self.cache_version, self.cache_context(item))
+                if errors is not None:
+                    cached_errors[path_to_wav] = errors
+        pending_tasks = [task for task in tasks if task[0] not in cached_errors]
+
+        if self.use_bwfmetaedit:
+            items_by_path = dict(pending_tasks)
+            batches = []
+            for paths_to_wavs in self.batch_paths_to_wavs([path_to_wav for path_to_wav, _ in pending_tasks]):
+                batches.append([(path_to_wav, items_by_path[path_to_wav]) for path_to_wav in paths_to_wavs])
+        else:
+            batches = [[task] for task in pending_tasks]
+
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            if self.workers > 1:
+                buffers = executor.map(self.validate_wav_batch_task, batches)
+            else:
+                buffers = map(self.validate_wav_batch_task, batches)
+            batch_results = zip(batches, buffers)
+
+            # Results are added in path order, pulling batch results as they are needed
+            results = {}
+            for path_to_wav, item in tqdm(tasks, desc="WAV BEXT Chunk Validation"):
+                if path_to_wav in cached_errors:
+                    errors = cached_errors[path_to_wav]
+                else:
+                    while path_to_wav not in results:
+                        batch, (buffer, read_failures) = next(batch_results)
+                        for batch_path_to_wav, batch_item in batch:
+                            results[batch_path_to_wav] = [error for error in buffer if error[1] == batch_path_to_wav]
+                            # Read failures may be transient (e.g., a network share dropping out), so they are not cached
+                            if cache and batch_path_to_wav not in read_failures:
+                                cache.put(self.validation, self.project.entries[batch_path_to_wav], self.cache_version, self.cache_context(batch_item), results[batch_path_to_wav])
+                    errors = results.pop(path_to_wav)
+                self.flush(errors)
+
+    def cache_context(self, item):
+        """
+        Returns the validation cache context for an item's WAV files: their results depend on the item's metadata export values
+        and on whether BEXT chunks are read by BWF MetaEdit or the built-in chunk reader"""
+        reader = "bwfmetaedit" if self.use_bwfmetaedit else "wav_chunks"
+        return self.project.cache.make_context(item["id"], self.project.metadata["item_metadata"].get(item["id"]), reader)
@@ -0,0 +1,266 @@
+import os
+import struct
+
+
+# Fixed-width text fields at the start of a BEXT chunk, in order, with their sizes in bytes
+# https://tech.ebu.ch/docs/tech/tech3285.pdf
+BEXT_TEXT_FIELDS = [
+    ("Description", 256),
+    ("Originator", 32),
+    ("OriginatorReference", 32),
+    ("OriginationDate", 10),
+    ("OriginationTime", 8),
+]
+# TimeReferenceLow, TimeReferenceHigh, Version
+BEXT_NUMERIC_FIELDS = struct.Struct("<IIH")
+# UMID, five loudness values and the reserved block that precede CodingHistory
+BEXT_CODING_HISTORY_OFFSET = 256 + 32 + 32 + 10 + 8 + BEXT_NUMERIC_FIELDS.size + 64 + 10 + 180
+# wFormatTag, nChannels, nSamplesPerSec, nAvgBytesPerSec, nBlockAlign, wBitsPerSample
+FMT_FIELDS = struct.Struct("<HHIIHH")
+# RIFF forms of WAV files; RF64 (EBU Tech 3306) and BW64 (ITU-R BS.2088) files larger than 4 GB keep 64-bit sizes in a ds64 chunk
+# https://tech.ebu.ch/docs/tech/tech3306v1_1.pdf
+RIFF_FORMS = [b"RIFF", b"RF64", b"BW64"]
+# 32-bit chunk size meaning "see the ds64 chunk"
+RF64_SIZE_PLACEHOLDER = 0xFFFFFFFF
+# RIFF size, data size and sample count, then the number of entries in the ds64 table of other chunk sizes
+DS64_FIELDS = struct.Struct("<QQQI")
+DS64_TABLE_ENTRY = struct.Struct("<4sQ")
+
+
+class WavChunkError(Exception):
+    pass
+
+
+def _decode_text(raw):
+    """
+    Helper function to decode a null-padded BEXT or INFO text field"""
+    raw = raw.split(b"\x00", 1)[0]
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def parse_ds64_chunk(data):
+    """
+    Parses the payload of an RF64/BW64 ds64 chunk into a dictionary with the 64-bit RIFF and data chunk sizes,
+    the sample count and a table of the 64-bit sizes of any other chunks larger than 4 GB"""
+    if len(data) < DS64_FIELDS.size:
+        raise WavChunkError("ds64 chunk is {} bytes, expected at least {}".format(len(data), DS64_FIELDS.size))
+    riff_size, data_size, sample_count, table_length = DS64_FIELDS.unpack_from(data)
+    table = {}
+    for index in range(table_length):
+        offset = DS64_FIELDS.size + index * DS64_TABLE_ENTRY.size
+        if offset + DS64_TABLE_ENTRY.size > len(data):
+            break
+        chunk_id, chunk_size = DS64_TABLE_ENTRY.unpack_from(data, offset)
+        table[chunk_id] = chunk_size
+
+    return {"riff_size": riff_size, "data_size": data_size, "sample_count": sample_count, "table": table}
+
+
+def read_riff_header(f):
+    """
+    Reads the RIFF header of an open RIFF/WAVE, RF64/WAVE or BW64/WAVE file, and its ds64 chunk if it has one
+    Returns the RIFF form, the RIFF chunk size and the parsed ds64 chunk (or None)"""
+    f.seek(0)
+    header = f.read(12)
+    if len(header) < 12 or header[0:4] not in RIFF_FORMS or header[8:12] != b"WAVE":
+        raise WavChunkError("not a RIFF/WAVE file")
+    form = header[0:4]
+    riff_size = struct.unpack_from("<I", header, 4)[0]
+
+    ds64 = None
+    if form != b"RIFF":
+        # The ds64 chunk must be the first chunk of an RF64/BW64 file
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8 or chunk_header[0:4] != b"ds64":
+            raise WavChunkError("{} file has no ds64 chunk".format(form.decode("ascii")))
+        ds64_size = struct.unpack_from("<I", chunk_header, 4)[0]
+        ds64 = parse_ds64_chunk(f.read(ds64_size))
+        if riff_size == RF64_SIZE_PLACEHOLDER:
+            riff_size = ds64["riff_size"]
+
+    return form, riff_size, ds64
+
+
+def iter_chunks(f):
+    """
+    Walks the chunk headers of an open RIFF/WAVE (or RF64/BW64) file without reading chunk payloads
+    Yields a (chunk_id, data_offset, data_size) tuple for each chunk, with 64-bit sizes from the ds64 chunk"""
+    _, _, ds64 = read_riff_header(f)
+
+    offset = 12
+    while True:
+        f.seek(offset)
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if ds64 is not None and chunk_size == RF64_SIZE_PLACEHOLDER:
+            if chunk_id == b"data":
+                chunk_size = ds64["data_size"]
+            else:
+                chunk_size = ds64["table"].get(chunk_id, chunk_size)
+        yield chunk_id, offset + 8, chunk_size
+        # Chunks are word-aligned, so odd-sized chunks are followed by a pad byte
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+
+def parse_bext_chunk(data):
+    """
+    Parses the payload of a BEXT chunk into a dictionary keyed by BWF MetaEdit CSV column names"""
+    bext = {}
+    offset = 0
+    for field, size in BEXT_TEXT_FIELDS:
+        bext[field] = _decode_text(data[offset:offset + size])
+        offset += size
+
+    if len(data) >= offset + BEXT_NUMERIC_FIELDS.size:
+        time_reference_low, time_reference_high, version = BEXT_NUMERIC_FIELDS.unpack_from(data, offset)
+        bext["TimeReference"] = str((time_reference_high << 32) + time_reference_low)
+        bext["BextVersion"] = str(version)
+    bext["CodingHistory"] = _decode_text(data[BEXT_CODING_HISTORY_OFFSET:])
+
+    return bext
+
+
+def parse_info_chunk(data):
+    """
+    Parses the payload of a LIST/INFO chunk (without its "INFO" list type) into a dictionary keyed by INFO tag (e.g., IART)"""
+    info = {}
+    offset = 0
+    while offset + 8 <= len(data):
+        tag, size = struct.unpack_from("<4sI", data, offset)
+        info[tag.decode("latin-1")] = _decode_text(data[offset + 8:offset + 8 + size])
+        offset += 8 + size + (size & 1)
+
+    return info
+
+
+def parse_fmt_chunk(data):
+    """
+    Parses the payload of a fmt chunk into a dictionary"""
+    if len(data) < FMT_FIELDS.size:
+        raise WavChunkError("fmt chunk is {} bytes, expected at least {}".format(len(data), FMT_FIELDS.size))
+    format_tag, channels, sample_rate, byte_rate, block_align, bits_per_sample = FMT_FIELDS.unpack_from(data)
+
+    return {
+        "format_tag": format_tag,
+        "channels": channels,
+        "sample_rate": sample_rate,
+        "byte_rate": byte_rate,
+        "block_align": block_align,
+        "bits_per_sample": bits_per_sample
+    }
+
+
+def parse_coding_history(coding_history):
+    """
+    Parses a BEXT CodingHistory value into a list with a dictionary of subelements for each line, e.g.:
+
+    A=ANALOGUE,M=mono,T=Studer A-810; 7.5 ips; open reel
+    A=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D
+
+    [
+        {"A": "ANALOGUE", "M": "mono", "T": "Studer A-810; 7.5 ips; open reel"},
+        {"A": "PCM", "F": "96000", "W": "24", "M": "mono", "T": "Antelope Audio;Orion 32;A/D"}
+    ]"""
+    coding_histories = []
+    for coding_history_line in coding_history.splitlines():
+        if coding_history_line:
+            subelements = {}
+            for subelement in coding_history_line.split(","):
+                subelement_tag = subelement.split("=")[0]
+                subelement_text = subelement.split("=")[1]
+                subelements[subelement_tag] = subelement_text
+            coding_histories.append(subelements)
+
+    return coding_histories
+
+
+def read_wav_header(path_to_wav):
+    """
+    Reads the RIFF header, the fmt chunk, the data chunk header and the BEXT CodingHistory of a WAV file
+    by seeking from chunk header to chunk header, without reading the audio data.
+    For RF64 and BW64 files, riff_size and data_size are the 64-bit sizes from the ds64 chunk.
+
+    Returns a dictionary, e.g.:
+    {
+        "file_size": 691200264,
+        "form": "RIFF",
+        "riff_size": 691200256,
+        "fmt": {"format_tag": 1, "channels": 1, "sample_rate": 96000, "byte_rate": 288000, "block_align": 3, "bits_per_sample": 24},
+        "data_offset": 1620,
+        "data_size": 691198644,
+        "coding_history": "A=ANALOGUE,M=mono,T=Studer A-810; 7.5 ips; open reel\r\nA=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D"
+    }
+
+    fmt, data_offset and data_size are None if the file has no fmt or data chunk; coding_history is None without a BEXT chunk."""
+    header = {"fmt": None, "data_offset": None, "data_size": None, "coding_history": None}
+
+    with open(path_to_wav, "rb") as f:
+        header["file_size"] = os.fstat(f.fileno()).st_size
+        for chunk_id, data_offset, data_size in iter_chunks(f):
+            if chunk_id == b"fmt " and header["fmt"] is None:
+                f.seek(data_offset)
+                header["fmt"] = parse_fmt_chunk(f.read(data_size))
+            elif chunk_id == b"data" and header["data_offset"] is None:
+                header["data_offset"] = data_offset
+                header["data_size"] = data_size
+            elif chunk_id == b"bext" and header["coding_history"] is None:
+                f.seek(data_offset)
+                header["coding_history"] = parse_bext_chunk(f.read(data_size))["CodingHistory"]
+
+        # iter_chunks has checked the RIFF header
+        form, header["riff_size"], _ = read_riff_header(f)
+        header["form"] = form.decode("ascii")
+
+    return header
+
+
+def read_bext_metadata(path_to_wav):
+    """
+    Reads the BEXT and LIST/INFO chunks of a WAV file by seeking from chunk header to chunk header,
+    so only a few kilobytes are read regardless of the size of the audio data.
+
+    Returns a dictionary using the same keys as a row of BWF MetaEdit's --out-core CSV, e.g.:
+    {
+        "FileName": "R:\\BAroQUe\\2019012\\0648\\0648-SR-4\\0648-SR-4-1-2-am.wav",
+        "Description": "Paul Phillips (Tape No. 4)",
+        "Originator": "US, MiU-H",
+        "OriginatorReference": "MiU-H_0648-SR-4-1-am",
+        "OriginationDate": "2019-05-20",
+        "OriginationTime": "12:04:58",
+        "TimeReference": "276384000",
+        "BextVersion": "1",
+        "CodingHistory": "A=ANALOGUE,M=mono,T=Studer A-810; 7.5 ips; open reel\\r\\nA=PCM,F=96000,W=24,M=mono,T=Antelope Audio;Orion 32;A/D",
+        "IART": "Schreibeis, Ryan"
+    }
+
+    A WAV file without a BEXT chunk returns empty values for the BEXT fields, as BWF MetaEdit does."""
+    metadata = {"FileName": path_to_wav, "TimeReference": "", "BextVersion": ""}
+    for field, _ in BEXT_TEXT_FIELDS:
+        metadata[field] = ""
+    metadata["CodingHistory"] = ""
+
+    with open(path_to_wav, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        found_bext = False
+        found_info = False
+        for chunk_id, data_offset, data_size in iter_chunks(f):
+            if data_offset + data_size > file_size:
+                data_size = file_size - data_offset
+            if chunk_id == b"bext" and not found_bext:
+                f.seek(data_offset)
+                metadata.update(parse_bext_chunk(f.read(data_size)))
+                found_bext = True
+            elif chunk_id == b"LIST" and not found_info and data_size >= 4:
+                f.seek(data_offset)
+                if f.read(4) == b"INFO":
+                    metadata.update(parse_info_chunk(f.read(data_size - 4)))
+                    found_info = True
+            if found_bext and found_info:
+                break
+
+    return metadata
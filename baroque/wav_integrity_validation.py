@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+from .baroque_validator import BaroqueValidator
+from .wav_chunks import parse_coding_history, read_wav_header, WavChunkError
+
+
+# Number of channels for each CodingHistory mode (M=) value
+# https://tech.ebu.ch/docs/r/r098.pdf
+CODING_HISTORY_MODE_CHANNELS = {
+    "mono": 1,
+    "stereo": 2,
+    "dual-mono": 2,
+    "joint-stereo": 2
+}
+
+
+class WavIntegrityValidator(BaroqueValidator):
+    def __init__(self, project, workers=1):
+        validation = "wav_integrity"
+        validator = self.validate_wav_integrity
+        super().__init__(validation, validator, project)
+        self.workers = workers
+
+    def check_sizes(self, path_to_wav, item_id, header):
+        """
+        Checks that the RIFF and data chunk sizes agree with the size of the file on disk"""
+        riff_end = header["riff_size"] + 8
+        if riff_end > header["file_size"]:
+            self.error(
+                path_to_wav,
+                item_id,
+                "wav file is truncated: RIFF chunk size requires {} bytes but file has {} bytes".format(riff_end, header["file_size"])
+            )
+        elif riff_end < header["file_size"]:
+            self.warn(
+                path_to_wav,
+                item_id,
+                "wav file has {} bytes after the end of the RIFF chunk".format(header["file_size"] - riff_end)
+            )
+
+        if header["data_offset"] is None:
+            self.error(path_to_wav, item_id, "wav file has no data chunk")
+            return
+        data_end = header["data_offset"] + header["data_size"]
+        if data_end > header["file_size"]:
+            self.error(
+                path_to_wav,
+                item_id,
+                "wav file is truncated: data chunk size requires {} bytes but file has {} bytes".format(data_end, header["file_size"])
+            )
+        if header["fmt"] and header["fmt"]["block_align"] and header["data_size"] % header["fmt"]["block_align"] != 0:
+            self.error(
+                path_to_wav,
+                item_id,
+                "data chunk size {} is not a multiple of the fmt chunk block size {}".format(header["data_size"], header["fmt"]["block_align"])
+            )
+
+    def check_coding_history(self, path_to_wav, item_id, fmt, coding_history):
+        """
+        Checks that the sample rate, bit depth and channel count in the fmt chunk match the last line of the
+        BEXT CodingHistory, which describes the WAV file itself (e.g., A=PCM,F=96000,W=24,M=mono,T=...)"""
+        try:
+            coding_histories = parse_coding_history(coding_history)
+        except IndexError:
+            # Malformed coding history subelements are reported by WAV BEXT chunk validation
+            return
+        if not coding_histories:
+            return
+        subelements = coding_histories[-1]
+
+        expected_values = [
+            ("F", "sample rate", fmt["sample_rate"], lambda text: int(text)),
+            ("W", "bit depth", fmt["bits_per_sample"], lambda text: int(text)),
+            ("M", "channel count", fmt["channels"], lambda text: CODING_HISTORY_MODE_CHANNELS[text.strip().lower()])
+        ]
+        for tag, name, fmt_value, parse in expected_values:
+            if tag not in subelements:
+                continue
+            try:
+                coding_history_value = parse(subelements[tag])
+            except (ValueError, KeyError):
+                # Values that are not numbers or known modes are reported by WAV BEXT chunk validation
+                continue
+            if coding_history_value != fmt_value:
+                self.error(
+                    path_to_wav,
+                    item_id,
+                    "fmt chunk {} {} does not match CodingHistory {}={}".format(name, fmt_value, tag, subelements[tag])
+                )
+
+    def validate_wav(self, path_to_wav, item_id):
+        """
+        Validates one WAV file's RIFF header, fmt chunk and data chunk header"""
+        try:
+            header = read_wav_header(path_to_wav)
+        except (OSError, WavChunkError) as e:
+            self.error(path_to_wav, item_id, "wav file could not be read: {}".format(e))
+            return
+
+        self.check_sizes(path_to_wav, item_id, header)
+        if header["fmt"] is None:
+            self.error(path_to_wav, item_id, "wav file has no fmt chunk")
+        elif header["coding_history"]:
+            self.check_coding_history(path_to_wav, item_id, header["fmt"], header["coding_history"])
+
+    def validate_wav_task(self, task):
+        """
+        Validates a WAV file with a buffered copy of the validator and returns its errors"""
+        path_to_wav, item_id = task
+        worker = self.buffered()
+        worker.validate_wav(path_to_wav, item_id)
+        return worker.buffer
+
+    def validate_wav_integrity(self):
+        """
+        Validates the header of every WAV file
+
+        Only the RIFF header, the fmt chunk, the BEXT chunk and the data chunk header are read, a few hundred bytes per file.
+        With more than one worker, WAV files are read by a thread pool.
+        Each WAV file's errors are collected in its own buffer and added to the project in path order."""
+        tasks = []
+        for item in self.project.items:
+            for path_to_wav in self.project.get_item_file_paths(item, "wav"):
+                tasks.append((path_to_wav, item["id"]))
+        tasks.sort(key=lambda task: task[0])
+
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            if self.workers > 1:
+                buffers = executor.map(self.validate_wav_task, tasks)
+            else:
+                buffers = map(self.validate_wav_task, tasks)
+
+            for buffer in tqdm(buffers, total=len(tasks), desc="WAV Integrity Validation"):
+                self.flush(buffer)
@@ -9,9 +9,9 @@ strptime_datafile = inspect.getfile(_strptime)
 executables = [Executable("baroque.py")]
 build_exe_options = {
                     "packages": [
-                                "argparse", "configparser", "csv", "dateparser",
-                                "datetime", "io", "lxml", "openpyxl", "os", 
-                                "subprocess", "sys", "tqdm", "unicodedata", "warnings"
+                                "argparse", "concurrent", "configparser", "csv", "dateparser",
+                                "datetime", "hashlib", "io", "json", "lxml", "multiprocessing", "openpyxl", "os", "sqlite3",
+                                "struct", "subprocess", "sys", "tqdm", "unicodedata", "warnings"
                             ],
                     "include_files": [strptime_datafile, "tools/"]
                     }
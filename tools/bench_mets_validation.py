@@ -0,0 +1,145 @@
+"""
+Benchmarks METS validation on a synthetic shipment
+
+Builds a shipment of synthetic items (10,000 by default), each with a METS file describing two digital parts and
+empty WAV, MP3 and text files, plus a matching metadata export, then times MetsValidator over the whole shipment
+and prints the time per item. The validation cache is not used, so every METS file is parsed and checked.
+
+The comparison of METS and metadata export dates is skipped unless --with-dates is given: it is timed by
+dateparser rather than by METS validation, and its cost depends heavily on the installed version of dateparser.
+
+To compare two versions of BAroQUe, run the script once against each checkout with --repo, e.g.:
+    git worktree add /tmp/baroque-before <commit>
+    python tools/bench_mets_validation.py --repo /tmp/baroque-before
+    python tools/bench_mets_validation.py
+
+Usage: python tools/bench_mets_validation.py [--items N] [--processes N] [--with-dates] [--repo PATH]
+"""
+import argparse
+import contextlib
+import csv
+import inspect
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+ITEMS_PER_COLLECTION = 100
+PARTS_PER_ITEM = 2
+PART_FILES = ["{}-am.wav", "{}-pm.wav", "{}.mp3"]
+
+METS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:dc="http://purl.org/dc/elements/1.1" xmlns:aes="http://www.aes.org/audioObject" xmlns:ph="http://www.aes.org/processhistory" xmlns:mods="http://www.loc.gov/mods/v3" xmlns:xlink="http://www.w3.org/1999/xlink" OBJID="{item_id}" TYPE="AUDIO RECORDING">
+<mets:metsHdr CREATEDATE="2019-08-05T11:47:37.538-04:00">
+<mets:agent ROLE="OTHER"><mets:name>The MediaPreserve</mets:name></mets:agent>
+<mets:agent ROLE="PRESERVATION" TYPE="ORGANIZATION"><mets:name>University of Michigan, Bentley Historical Library</mets:name></mets:agent>
+<mets:agent ROLE="DISSEMINATOR" TYPE="ORGANIZATION"><mets:name>University of Michigan, Bentley Historical Library</mets:name></mets:agent>
+</mets:metsHdr>
+<mets:dmdSec ID="dmd1"><mets:mdWrap MDTYPE="DC" LABEL="Dublin Core Metadata"><mets:xmlData>
+<dc:title>{item_title}</dc:title><dc:relation>{collection_title}</dc:relation><dc:identifier>{item_id}</dc:identifier><dc:date>{item_date}</dc:date><dc:format>audio</dc:format><dc:format.extent>1 reel</dc:format.extent>
+</mets:xmlData></mets:mdWrap></mets:dmdSec>
+<mets:amdSec>{tech_mds}<mets:techMD ID="txt"><mets:mdRef/></mets:techMD><mets:sourceMD ID="s"/><mets:digiprovMD ID="d"/></mets:amdSec>
+<mets:fileSec><mets:fileGrp ID="audio-files"><mets:fileGrp/><mets:fileGrp/><mets:fileGrp/></mets:fileGrp><mets:fileGrp ID="media_images"/></mets:fileSec>
+<mets:structMap><mets:div>{parts}</mets:div></mets:structMap>
+</mets:mets>
+"""
+TECH_MD_TEMPLATE = '<mets:techMD ID="t{number}"><mets:mdWrap><mets:xmlData><aes:audioObject><aes:primaryIdentifier>{file}</aes:primaryIdentifier></aes:audioObject></mets:xmlData></mets:mdWrap></mets:techMD>'
+FPTR_TEMPLATE = '<mets:fptr FILEID="mdp.{file}"/>'
+
+
+def make_shipment(directory, items):
+    """
+    Writes a synthetic shipment and metadata export to directory
+    Returns the paths to the shipment and the export"""
+    shipment = os.path.join(directory, "2019999")
+    export = os.path.join(directory, "export.csv")
+    with open(export, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["DigFile Calc", "COLLECTIONS::CollectionTitle", "ItemTitle", "ItemDate"])
+        for number in range(items):
+            collection_id = "{:05d}".format(90000 + number // ITEMS_PER_COLLECTION)
+            item_id = "{}-SR-{}".format(collection_id, number % ITEMS_PER_COLLECTION + 1)
+            values = {
+                "item_id": item_id,
+                "collection_title": "Synthetic Collection {} papers".format(collection_id),
+                "item_title": "Synthetic Recording (Tape No. {})".format(number + 1),
+                "item_date": "19{:02d}-0{}-1{}".format(number % 100, number % 9 + 1, number % 10)
+            }
+            writer.writerow([values["item_id"], values["collection_title"], values["item_title"], values["item_date"]])
+
+            item_path = os.path.join(shipment, collection_id, item_id)
+            os.makedirs(item_path)
+            files = []
+            parts = []
+            for part in range(1, PARTS_PER_ITEM + 1):
+                part_files = [part_file.format("{}-{}".format(item_id, part)) for part_file in PART_FILES]
+                files.extend(part_files)
+                parts.append("<mets:div>{}</mets:div>".format("".join(FPTR_TEMPLATE.format(file=file) for file in part_files)))
+            for file in files + [item_id + ".txt"]:
+                open(os.path.join(item_path, file), "wb").close()
+            with open(os.path.join(item_path, item_id + ".xml"), "w", encoding="utf-8") as f:
+                f.write(METS_TEMPLATE.format(
+                    tech_mds="".join(TECH_MD_TEMPLATE.format(number=number, file=file) for number, file in enumerate(files)),
+                    parts="".join(parts),
+                    **values
+                ))
+
+    return shipment, export
+
+
+def count_errors(errors):
+    """
+    Returns the number of errors in a project, whether they are in an ErrorStore or in the original dictionary of lists"""
+    if isinstance(errors, dict):
+        return sum(len(validation_errors) for validation_errors in errors.values())
+    return len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark METS validation on a synthetic shipment")
+    parser.add_argument("--items", type=int, default=10000, help="Number of synthetic items (default: 10000)")
+    parser.add_argument("--processes", type=int, default=1, help="Number of processes for METS validation, if supported")
+    parser.add_argument("--with-dates", action="store_true", help="Also compare METS and metadata export dates")
+    parser.add_argument("--repo", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), help="BAroQUe checkout to benchmark (default: this one)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.repo))
+    from baroque.baroque_project import BaroqueProject
+    from baroque.mets_validation import MetsValidator
+
+    directory = tempfile.mkdtemp(prefix="baroque-bench-")
+    try:
+        start = time.perf_counter()
+        shipment, export = make_shipment(directory, args.items)
+        print("created {} items in {:.1f} s".format(args.items, time.perf_counter() - start))
+
+        # Options added by later versions are only passed to versions that have them
+        project_options = {}
+        if "use_cache" in inspect.signature(BaroqueProject).parameters:
+            project_options["use_cache"] = False
+        validator_options = {}
+        if "processes" in inspect.signature(MetsValidator).parameters:
+            validator_options["processes"] = args.processes
+        elif args.processes != 1:
+            print("this version of MetsValidator has no processes option; using 1 process")
+        if not args.with_dates:
+            # Replaced on the class, so that worker processes started by fork skip date comparisons too
+            MetsValidator.check_dates = lambda self, metadata_date, mets_date: None
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            project = BaroqueProject(shipment, directory, export, **project_options)
+        start = time.perf_counter()
+        MetsValidator(project, **validator_options).validate()
+        elapsed = time.perf_counter() - start
+        print("validated {} items in {:.2f} s: {:.0f} us/item, {} errors".format(
+            args.items, elapsed, elapsed / args.items * 1e6, count_errors(project.errors)
+        ))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
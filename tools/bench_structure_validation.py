@@ -0,0 +1,109 @@
+"""
+Benchmarks how structure validation scales with the number of items in a shipment
+
+Builds synthetic in-memory projects of increasing size (up to 100,000 items by default), with 100 items per
+collection and 15 files per item, and times StructureValidator on each. No files are written: the project's
+inventory is filled in directly, so only the validator's own work is timed. Every item has a missing digital part
+and missing MP3 checksum files, and 1% of items are missing from the metadata export, so the checks that map IDs
+back to paths are exercised. The time per item should stay roughly constant as the number of items grows.
+
+To compare two versions of BAroQUe, run the script once against each checkout with --repo, e.g.:
+    git worktree add /tmp/baroque-before <commit>
+    python tools/bench_structure_validation.py --repo /tmp/baroque-before --sizes 1000 5000 10000
+    python tools/bench_structure_validation.py
+Versions without an item index are quadratic, so keep their sizes small.
+
+Usage: python tools/bench_structure_validation.py [--sizes N [N ...]] [--repo PATH]
+"""
+import argparse
+import os
+import sys
+import time
+
+
+ITEMS_PER_COLLECTION = 100
+# Digital parts of each item; part 3 is left out so that every item has a part numbering error
+PARTS = [1, 2, 4]
+# Every 100th item is left out of the metadata export
+MISSING_FROM_EXPORT_EVERY = 100
+
+
+def make_project(baroque_project, InventoryEntry, errors, items):
+    """
+    Returns a synthetic BaroqueProject with a shipment of items, built without touching the filesystem"""
+    project = baroque_project.BaroqueProject.__new__(baroque_project.BaroqueProject)
+    project.source_directory = "/shipment"
+    project.destination_directory = "/reports"
+    project.metadata_export = "/shipment/export.csv"
+    project.source_type = "shipment"
+    project.shipment = [{"id": "shipment", "path": "/shipment"}]
+    project.collections = []
+    project.items = []
+    project.collections_by_id = {}
+    project.items_by_id = {}
+    project.inventory = {"/shipment": []}
+    project.entries = {}
+    project.errors = errors
+    project.cache = None
+    project.metadata = {"collections_ids": [], "items_ids": [], "item_metadata": {}}
+
+    for number in range(items):
+        collection_id = "{:05d}".format(number // ITEMS_PER_COLLECTION)
+        collection_path = "/shipment/" + collection_id
+        if collection_id not in project.collections_by_id:
+            collection = {"id": collection_id, "path": collection_path}
+            project.collections.append(collection)
+            project.collections_by_id[collection_id] = collection
+            project.inventory["/shipment"].append(InventoryEntry(collection_id, collection_path, True, 0, 0, 0, 0))
+            project.inventory[collection_path] = []
+            project.metadata["collections_ids"].append(collection_id)
+
+        item_id = "{}-SR-{}".format(collection_id, number)
+        item_path = collection_path + "/" + item_id
+        project.inventory[collection_path].append(InventoryEntry(item_id, item_path, True, 0, 0, 0, 0))
+        files = {"wav": [], "mp3": [], "jpg": [item_id + "-001.jpg", item_id + "-002.jpg"], "xml": [item_id + ".xml"], "md5": [], "txt": [], "other": []}
+        for part in PARTS:
+            part_id = "{}-{}".format(item_id, part)
+            files["wav"].extend([part_id + "-am.wav", part_id + "-pm.wav"])
+            files["mp3"].append(part_id + ".mp3")
+            # The MP3 checksum files are left out, so that every part has a missing file
+            files["md5"].extend([part_id + "-am.wav.md5", part_id + "-pm.wav.md5"])
+        names = sorted(name for names in files.values() for name in names)
+        project.inventory[item_path] = [InventoryEntry(name, item_path + "/" + name, False, 10, 0, 0, 0) for name in names]
+        for entry in project.inventory[item_path]:
+            project.entries[entry.path] = entry
+
+        item = {"id": item_id, "path": item_path, "files": files}
+        project.items.append(item)
+        project.items_by_id[item_id] = item
+        if number % MISSING_FROM_EXPORT_EVERY:
+            project.metadata["items_ids"].append(item_id)
+
+    return project
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark how structure validation scales with the number of items")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 50000, 100000], help="Numbers of items to time")
+    parser.add_argument("--repo", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), help="BAroQUe checkout to benchmark (default: this one)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.repo))
+    from baroque import baroque_project, structure_validation
+    from baroque.baroque_project import InventoryEntry
+    from baroque.error_store import ErrorStore
+
+    # Progress bars would be drawn for every item
+    structure_validation.tqdm = lambda iterable, **kwargs: iterable
+
+    print("{:>8}  {:>8}  {:>8}  {:>8}".format("items", "seconds", "us/item", "errors"))
+    for items in args.sizes:
+        project = make_project(baroque_project, InventoryEntry, ErrorStore(), items)
+        start = time.perf_counter()
+        structure_validation.StructureValidator(project).validate()
+        elapsed = time.perf_counter() - start
+        print("{:>8}  {:>8.2f}  {:>8.1f}  {:>8}".format(items, elapsed, elapsed / items * 1e6, len(project.errors)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Compares the original sanitize_text with the translation-table version in baroque/utils.py
+
+Both functions are run over the title and date values of a metadata export (CSV or xlsx), a list of accented,
+symbol and whitespace edge cases, and optionally every Unicode code point. Any input they sanitize differently is
+printed, and the script exits with status 1 if there are differences.
+
+With --benchmark, the throughput of the original function, the translation table alone and the translation table
+with memoization is also measured on realistic titles (the export's values, if given, and the strings validators
+sanitize for every item).
+
+Usage: python tools/compare_sanitize_text.py [path/to/metadata_export.csv] [--all-code-points] [--benchmark]
+"""
+import argparse
+import csv
+import os
+import sys
+import timeit
+import unicodedata
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from baroque.utils import sanitize_text
+
+
+# Metadata export columns whose values are sanitized before they are compared with METS and BEXT values
+EXPORT_COLUMNS = ["COLLECTIONS::CollectionTitle", "ItemTitle", "ItemDate"]
+
+EDGE_CASES = [
+    "",
+    " ",
+    "Paul Phillips (Tape No. 1)",
+    "  Leading, trailing   and\trepeated\nwhitespace  ",
+    "Non breaking\u00a0and\u3000ideographic\u2003spaces",
+    "Line\r\nbreaks and\u2028separators",
+    "A & B",
+    "A&B&&C",
+    "Ann Arbor & Detroit / 1970-1975",
+    "1/2/1970",
+    "c. 1970 - [1975?]",
+    "Café Élysée, Zürich, Ångström, Søren, Łódź",
+    "Crème brûlée naïve façade",
+    "Mañana São Paulo Åland Ærø",
+    "Straße and İstanbul",
+    "Decomposed e\u0301 and n\u0303 and a\u030a",
+    "Stacked marks a\u0323\u0301\u0302 and orphan \u0301mark",
+    "Ligatures ﬁ ﬂ ĳ Œuvre",
+    "Titlecase ǅ and ǆ",
+    "Fullwidth Ｆｕｌｌｗｉｄｔｈ １２３",
+    "Superscripts x² and fractions ½ ⅓",
+    "Circled ① ② and Roman ⅠⅫ numerals",
+    "Arabic-Indic digits ١٢٣ and Devanagari १२",
+    "Greek Αθήνα and Cyrillic Москва",
+    "CJK 東京 and kana カタカナ",
+    "Hebrew שלום and Arabic مرحبا",
+    "Quotes “double” ‘single’ «guillemets»",
+    "Dashes – en — em − minus",
+    "Symbols © ® ™ ° § ¶ † • …",
+    "Currency $ £ € ¥",
+    "Punctuation !\"#$%'()*+,-.:;<=>?@[\\]^_`{|}~",
+    "Slashes / \\ ⁄ ∕",
+    "Emoji \U0001f3b5 and \U0001f1fa\U0001f1f8 flags",
+    "Zero width\u200bspace\u200cjoiner\u200d and BOM\ufeff",
+    "Control characters \x00\x07\x1b\x7f",
+    "Mathematical \U0001d400\U0001d401 and \U0001d7ce\U0001d7cf"
+]
+
+# Strings the METS and BEXT validators sanitize for every item, and titles like those in metadata exports
+BENCHMARK_TITLES = [
+    "US, MiU-H",
+    "University of Michigan, Bentley Historical Library",
+    "The MediaPreserve",
+    "Paul Phillips papers",
+    "Wolverine & Friends: Recordings of the Marching Band, 1975-1980",
+    "Conférence de presse — Président Gerald R. Ford",
+    "1970-01-02"
+] + ["Paul Phillips (Tape No. {})".format(number) for number in range(1, 200)]
+# Number of calls timed for each function, and number of times each measurement is repeated
+BENCHMARK_CALLS = 200000
+BENCHMARK_REPEATS = 3
+
+
+def baseline_sanitize_text(string):
+    """
+    sanitize_text as it was before the translation table and memoization were added"""
+    if string is None:
+        return ""
+    else:
+        string = string.replace("&", "and")
+
+        # Replace "runs of consecutive whitespace" to single spaces AND remove trailing spaces
+        # https://docs.python.org/3.8/library/stdtypes.html#str.split
+        string = " ".join(string.split()).strip()
+
+        # Remove non-alphanumeric characters BUT keeps single spaces and "/" (for date format)
+        # https://stackoverflow.com/questions/7406102/create-sane-safe-filename-from-any-unsafe-string
+        keep_characters = (" ", "/")
+        string = "".join(c for c in string if c.isalnum() or c in keep_characters)
+
+        # Normalize unicode accents
+        # https://stackoverflow.com/questions/44431730/how-to-replace-accented-characters-in-python?rq=1
+        # https://docs.python.org/3.8/library/unicodedata.html#unicodedata.normalize
+        string = unicodedata.normalize('NFD', string).encode('ascii', 'ignore').decode()
+
+        return string
+
+
+def read_export_rows(metadata_export):
+    """
+    Yields the rows of a CSV or xlsx metadata export, as sequences of values"""
+    export_type = os.path.splitext(metadata_export)[1]
+    if export_type == ".csv":
+        with open(metadata_export, "r", newline="") as f:
+            yield from csv.reader(f)
+    elif export_type == ".xlsx":
+        from openpyxl import load_workbook
+        # hide openpyxl's "UserWarning: Workbook contains no default style" message
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            workbook = load_workbook(metadata_export, read_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        sys.exit("metadata export is an unexpected file type: {}".format(export_type))
+
+
+def read_export_values(metadata_export):
+    """
+    Returns the distinct values of the metadata export's title and date columns"""
+    rows = read_export_rows(metadata_export)
+    keys = list(next(rows, []))
+    positions = [keys.index(column) for column in EXPORT_COLUMNS if column in keys]
+    if not positions:
+        sys.exit("none of the {} columns were found in the metadata export".format(", ".join(EXPORT_COLUMNS)))
+
+    values = set()
+    for row in rows:
+        for position in positions:
+            if position < len(row) and row[position] is not None:
+                values.add(str(row[position]))
+    return sorted(values)
+
+
+def compare(label, strings):
+    """
+    Prints each string that the two functions sanitize differently
+    Returns the number of differences"""
+    differences = 0
+    for string in strings:
+        baseline = baseline_sanitize_text(string)
+        current = sanitize_text(string)
+        if baseline != current:
+            differences += 1
+            print("{}: {!r}\n    baseline: {!r}\n    current:  {!r}".format(label, string, baseline, current))
+    print("{}: {} difference(s) in {} value(s)".format(label, differences, len(strings)))
+    return differences
+
+
+def benchmark(strings):
+    """
+    Prints the time per call of the original function, the translation table without memoization and the current
+    function, calling each BENCHMARK_CALLS times on strings in turn"""
+    calls = [strings[i % len(strings)] for i in range(BENCHMARK_CALLS)]
+    functions = [
+        ("original", baseline_sanitize_text),
+        ("translation table", sanitize_text.__wrapped__),
+        ("translation table + lru_cache", sanitize_text)
+    ]
+    print("benchmark: {} calls on {} distinct strings".format(BENCHMARK_CALLS, len(set(strings))))
+    for name, function in functions:
+        sanitize_text.cache_clear()
+        # The best of several repeats is least affected by other processes
+        elapsed = min(timeit.repeat(lambda: [function(string) for string in calls], number=1, repeat=BENCHMARK_REPEATS))
+        print("    {:<30} {:>8.2f} us/call".format(name, elapsed / BENCHMARK_CALLS * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the original and current sanitize_text functions and their throughput")
+    parser.add_argument("metadata_export", nargs="?", help="Path to a metadata export (CSV or xlsx) whose titles and dates are compared")
+    parser.add_argument("--all-code-points", action="store_true", help="Also compare every Unicode code point except surrogates")
+    parser.add_argument("--benchmark", action="store_true", help="Also measure the throughput of each implementation on realistic titles")
+    args = parser.parse_args()
+
+    differences = 0
+    export_values = []
+    if args.metadata_export:
+        export_values = read_export_values(args.metadata_export)
+        differences += compare("export", export_values)
+    differences += compare("edge case", EDGE_CASES + [None])
+    if args.all_code_points:
+        code_points = [chr(codepoint) for codepoint in range(sys.maxunicode + 1) if not 0xD800 <= codepoint <= 0xDFFF]
+        differences += compare("code point", code_points)
+        # Characters next to a combining mark, since the current function normalizes each character separately
+        differences += compare("code point + mark", ["a" + character + "\u0301" for character in code_points])
+    if args.benchmark:
+        benchmark(export_values + BENCHMARK_TITLES)
+
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()